@@ -0,0 +1,151 @@
+import argparse
+import csv
+import dataclasses
+import importlib
+import math
+import statistics
+import sys
+from datetime import datetime
+from pathlib import Path
+from playwright.sync_api import sync_playwright
+from harness import HEADLESS, Harness
+from run_history import SIGNIFICANCE_LEVEL, wilcoxon_signed_rank
+
+# ===================================== CONFIGURATION ===================================== #
+BASELINE_URL = "https://app.faybl.com" # Environment the candidate is compared against (production)
+CANDIDATE_URL = "https://staging.faybl.com" # Environment under test (staging build)
+AB_PAIRS = 8 # Runs per environment; each pair runs both environments back to back (6 or more, see main)
+MIN_EFFECT = 0.05 # Significant changes smaller than this fraction of the baseline median are not flagged
+# ========================================================================================= #
+
+def first_attempt_durations(result) -> dict:
+    return {row["action"].strip(): row["duration"] for row in result.time_data
+            if row.get("attempt", 1) == 1 and row["duration"] is not None}
+
+def run_pairs(harness, baseline, candidate, pairs: int = AB_PAIRS) -> list[dict]:
+    """Run both environments back to back `pairs` times per client, alternating which one goes first
+    (ABBA order), so drift in load over the session affects both sides alike."""
+    clients = list(dict.fromkeys(u.client_index for u in baseline.units()))
+    samples = []
+    for pair in range(1, pairs + 1):
+        for client_index in clients:
+            order = [("baseline", baseline), ("candidate", candidate)]
+            if pair % 2 == 0:
+                order.reverse()
+            sample = {"pair": pair, "client": baseline.unit(pair, client_index).client_name}
+            for side, scenario in order:
+                result = scenario.run(harness, pair, client_index)
+                sample[side] = None if result.failed else first_attempt_durations(result)
+                if result.failed:
+                    print(f"  [WARNING] {side} run {pair} failed, the pair is left out: {result.error}")
+            samples.append(sample)
+    return samples
+
+def compare(samples: list[dict], alpha: float = SIGNIFICANCE_LEVEL, min_effect: float = MIN_EFFECT) -> list[dict]:
+    """Per action: medians of both sides, paired deltas (candidate - baseline) and a Wilcoxon signed-rank test."""
+    complete = [s for s in samples if s["baseline"] is not None and s["candidate"] is not None]
+    actions = list(dict.fromkeys(a for s in complete for a in s["baseline"] if a in s["candidate"]))
+    results = []
+    for action in actions:
+        pairs = [(s["baseline"][action], s["candidate"][action]) for s in complete
+                 if action in s["baseline"] and action in s["candidate"]]
+        base = [b for b, _ in pairs]
+        cand = [c for _, c in pairs]
+        deltas = [c - b for b, c in pairs]
+        base_median = statistics.median(base)
+        change = statistics.median(cand) / base_median - 1 if base_median else None
+        p_value = wilcoxon_signed_rank(deltas)
+        flag = ""
+        if change is not None and p_value < alpha and abs(change) >= min_effect:
+            flag = "SLOWER" if change > 0 else "faster"
+        results.append({"action": action, "pairs": len(pairs), "baseline_median": base_median,
+                        "candidate_median": statistics.median(cand), "median_delta": statistics.median(deltas),
+                        "change": change, "p_value": p_value, "flag": flag})
+    return results
+
+def print_comparison(results: list[dict], baseline_url: str, candidate_url: str) -> None:
+    print(f"\nCandidate {candidate_url} vs baseline {baseline_url} (paired, candidate - baseline)")
+    print(f"  {'Action':<45} {'Pairs':>5} {'Base (s)':>9} {'Cand (s)':>9} {'Delta (s)':>10} {'Change':>8} {'p':>7}")
+    for r in results:
+        change = "-" if r["change"] is None else f"{r['change'] * 100:+.1f}%"
+        print(f"  {r['action'][:45]:<45} {r['pairs']:>5} {r['baseline_median']:>9.2f} {r['candidate_median']:>9.2f} "
+              f"{r['median_delta']:>+10.2f} {change:>8} {r['p_value']:>7.3f}  {r['flag']}")
+
+def write_comparison(path: Path, scenario, baseline_url: str, candidate_url: str, results: list[dict],
+                     samples: list[dict]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, mode="a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([f"A/B {scenario.title}: {candidate_url} vs {baseline_url} - "
+                    f"{datetime.now().isoformat(timespec='seconds')}"])
+        w.writerow(["Action", "Pairs", "Baseline median (s)", "Candidate median (s)", "Median delta (s)",
+                    "Change", "p-value", "Result"])
+        for r in results:
+            change = "" if r["change"] is None else f"{r['change'] * 100:+.1f}%"
+            w.writerow([r["action"], r["pairs"], f"{r['baseline_median']:.2f}", f"{r['candidate_median']:.2f}",
+                        f"{r['median_delta']:+.2f}", change, f"{r['p_value']:.4f}", r["flag"] or "ok"])
+        w.writerow([])
+        w.writerow(["Pair", "Client", "Action", "Baseline (s)", "Candidate (s)"])
+        for s in samples:
+            if s["baseline"] is None or s["candidate"] is None:
+                w.writerow([s["pair"], s["client"], "FAILED", "", ""])
+                continue
+            for action, base in s["baseline"].items():
+                cand = s["candidate"].get(action)
+                w.writerow([s["pair"], s["client"], action, f"{base:.2f}", "" if cand is None else f"{cand:.2f}"])
+        w.writerow([])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run a suite against two environments in interleaved pairs "
+                                                 "and compare per-action latency.")
+    parser.add_argument("suite", help="Suite module (e.g. ybl_api_1517)")
+    parser.add_argument("--baseline", default=BASELINE_URL, help="Baseline base URL")
+    parser.add_argument("--candidate", default=CANDIDATE_URL, help="Candidate base URL")
+    parser.add_argument("--pairs", type=int, default=AB_PAIRS, help="Runs per environment")
+    parser.add_argument("--alpha", type=float, default=SIGNIFICANCE_LEVEL, help="Significance level")
+    parser.add_argument("--min-effect", type=float, default=MIN_EFFECT, help="Smallest relative change flagged")
+    parser.add_argument("--gate", action="store_true", help="Exit with status 1 when the candidate is significantly slower, "
+                        "a run failed or an action kept too few pairs to test")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS, help="Run Chromium without a window")
+    args = parser.parse_args(argv)
+    # The exact two-sided signed-rank test cannot go below 2 / 2**pairs, however consistent the deltas are
+    if 2 ** (1 - args.pairs) > args.alpha:
+        message = (f"{args.pairs} pair(s) can never reach p < {args.alpha} (smallest possible p = "
+                   f"{2 ** (1 - args.pairs):.4f}), no action can be flagged.")
+        if args.gate:
+            parser.error(f"--gate needs more pairs: {message}")
+        print(f"[WARNING] {message}")
+
+    scenario = dataclasses.replace(importlib.import_module(args.suite).SCENARIO, num_runs=args.pairs)
+    baseline = scenario.with_base_url(args.baseline, "baseline")
+    candidate = scenario.with_base_url(args.candidate, "candidate")
+    with sync_playwright() as playwright:
+        harness = Harness(playwright, headless=args.headless)
+        try:
+            samples = run_pairs(harness, baseline, candidate, args.pairs)
+        finally:
+            harness.close()
+    results = compare(samples, args.alpha, args.min_effect)
+    print_comparison(results, args.baseline, args.candidate)
+    ab_csv = scenario.output_dir / "ab_comparison.csv"
+    write_comparison(ab_csv, scenario, args.baseline, args.candidate, results, samples)
+    print(f"\nA/B comparison appended to {ab_csv.name}")
+    failed_pairs = sum(s["baseline"] is None or s["candidate"] is None for s in samples)
+    if failed_pairs:
+        print(f"{failed_pairs} of {len(samples)} pair(s) had a failed run and were left out.")
+    slower = [r["action"] for r in results if r["flag"] == "SLOWER"]
+    if slower:
+        print(f"Candidate significantly slower on: {', '.join(slower)}")
+    if not args.gate:
+        return 0
+    # The gate only passes on evidence: every pair ran and every action kept enough pairs to reach alpha
+    needed = 1 + math.ceil(math.log2(1 / args.alpha)) # Smallest n with 2**(1-n) <= alpha
+    underpowered = [r["action"] for r in results if r["pairs"] < needed]
+    if underpowered:
+        print(f"Gate: fewer than {needed} complete pair(s), p < {args.alpha} unreachable for: {', '.join(underpowered)}")
+    if failed_pairs or not results:
+        print("Gate: failed runs, the candidate cannot pass.")
+    return 1 if slower or underpowered or failed_pairs or not results else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# ===================================== CONFIGURATION ===================================== #
+TRACE_ON_FAILURE = True # Record a Playwright trace (DOM snapshots + screencast) and keep it only if a step fails
+TRACE_WINDOW_STEPS = 3 # Steps held in the rolling trace chunk before it is discarded and restarted
+SUCCESS_CAPTURE_RATE = 0.0 # Fraction of success-path screenshots still taken (0 = none, 1 = all)
+SCREENSHOT_QUALITY = 70 # JPEG quality of sampled success screenshots
+# ========================================================================================= #
+
+# One shared writer thread so screenshot files never block a measured step
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot-writer")
+
+def safe_name(name: str) -> str:
+    return re.sub(r'[<>:"/\\|?*]+', "_", name).strip()
+
+class CapturePolicy:
+    """Failure-only tracing for one browser context, plus sampled success screenshots.
+
+    The trace is recorded in chunks. A chunk is dropped without being written once it spans
+    `window_steps` steps, so on success nothing reaches the disk; on failure the current chunk
+    (the failing step and up to `window_steps - 1` steps before it) is saved as a trace zip.
+    """
+
+    def __init__(self, context, trace_dir: Path, screenshot_dir: Path, trace: bool = TRACE_ON_FAILURE,
+                 window_steps: int = TRACE_WINDOW_STEPS, success_rate: float = SUCCESS_CAPTURE_RATE):
+        self.context = context
+        self.trace_dir = trace_dir
+        self.screenshot_dir = screenshot_dir
+        self.trace = trace
+        self.window_steps = max(1, window_steps)
+        self.success_rate = success_rate
+        self.pending_writes = []
+        self._steps_in_chunk = 0
+        self._rng = random.Random()
+        if self.trace:
+            context.tracing.start(screenshots=True, snapshots=True)
+            context.tracing.start_chunk()
+
+    def step(self, name: str) -> None:
+        """Mark the start of a step; rolls the trace chunk once it holds `window_steps` steps."""
+        if not self.trace:
+            return
+        if self._steps_in_chunk >= self.window_steps:
+            self.context.tracing.stop_chunk() # Discard, nothing is written
+            self.context.tracing.start_chunk(title=name)
+            self._steps_in_chunk = 0
+        self._steps_in_chunk += 1
+
+    def screenshot(self, page, name: str) -> None:
+        """Sampled success-path screenshot: viewport JPEG, written by a background thread."""
+        if self.success_rate <= 0 or self._rng.random() >= self.success_rate:
+            return
+        data = page.screenshot(type="jpeg", quality=SCREENSHOT_QUALITY)
+        path = self.screenshot_dir / f"{safe_name(name)}.jpg"
+        self.pending_writes.append(_writer.submit(path.write_bytes, data))
+
+    def failure(self, page, name: str) -> None:
+        """Persist the current trace chunk and an error screenshot for a failed step."""
+        name = safe_name(name)
+        self.trace_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            page.screenshot(path=str(self.trace_dir / f"{name}.png"))
+        except Exception as e:
+            print(f"  [WARNING] Could not take error screenshot: {e}")
+        if self.trace:
+            try:
+                trace_path = self.trace_dir / f"{name}_trace.zip"
+                self.context.tracing.stop_chunk(path=str(trace_path))
+                print(f"Trace saved to {trace_path} (open with: playwright show-trace)")
+                self.context.tracing.start_chunk()
+                self._steps_in_chunk = 0
+            except Exception as e:
+                print(f"  [WARNING] Could not save trace: {e}")
+
+    def close(self) -> None:
+        """Stop tracing without writing anything and wait for pending screenshot files."""
+        if self.trace:
+            try:
+                self.context.tracing.stop_chunk()
+                self.context.tracing.stop()
+            except Exception:
+                pass
+        for future in self.pending_writes:
+            future.result()
+        self.pending_writes.clear()
@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+
+# ===================================== CONFIGURATION ===================================== #
+DEFAULT_PROFILE = "desktop" # Unthrottled profile; its results keep the plain suite name
+# ========================================================================================= #
+
+@dataclass(frozen=True)
+class ClientProfile:
+    """Network and CPU conditions of an adviser's machine, applied to each page through CDP."""
+    name: str
+    latency_ms: float = 0 # Added round-trip latency
+    download_kbps: float | None = None # None = unthrottled
+    upload_kbps: float | None = None
+    cpu_slowdown: float = 1 # 4 = the CPU runs 4x slower
+    timeout_factor: float = 1.0 # Scales fixed fallback timeouts until the profile has its own history
+
+    @property
+    def throttles_network(self) -> bool:
+        return bool(self.latency_ms) or self.download_kbps is not None or self.upload_kbps is not None
+
+PROFILES = {p.name: p for p in (
+    ClientProfile(DEFAULT_PROFILE),
+    ClientProfile("fast-4g", latency_ms=40, download_kbps=9_000, upload_kbps=1_500, timeout_factor=1.5),
+    ClientProfile("slow-4g", latency_ms=150, download_kbps=1_600, upload_kbps=750, timeout_factor=3.0),
+    ClientProfile("cpu-4x", cpu_slowdown=4, timeout_factor=2.0),
+    ClientProfile("weak-laptop", latency_ms=150, download_kbps=1_600, upload_kbps=750, cpu_slowdown=4,
+                  timeout_factor=4.0),
+)}
+
+def get_profile(name: str) -> ClientProfile:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown client profile '{name}', choose from: {', '.join(PROFILES)}") from None
+
+def _bytes_per_second(kbps: float | None) -> float:
+    return -1 if kbps is None else kbps * 1000 / 8 # -1 disables throttling in CDP
+
+def apply_profile(context, page, profile: ClientProfile):
+    """Throttle `page` with Network.emulateNetworkConditions and Emulation.setCPUThrottlingRate.
+
+    Returns the CDP session (the conditions last as long as it stays attached), None for an unthrottled profile.
+    """
+    if not profile.throttles_network and profile.cpu_slowdown <= 1:
+        return None
+    cdp = context.new_cdp_session(page)
+    if profile.throttles_network:
+        cdp.send("Network.enable")
+        cdp.send("Network.emulateNetworkConditions", {
+            "offline": False,
+            "latency": profile.latency_ms,
+            "downloadThroughput": _bytes_per_second(profile.download_kbps),
+            "uploadThroughput": _bytes_per_second(profile.upload_kbps),
+        })
+    if profile.cpu_slowdown > 1:
+        cdp.send("Emulation.setCPUThrottlingRate", {"rate": profile.cpu_slowdown})
+    return cdp
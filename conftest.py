@@ -0,0 +1,51 @@
+import pytest
+import metrics
+from client_profiles import DEFAULT_PROFILE, PROFILES
+from har_replay import parse_timing
+from harness import Harness, load_input_data
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--client-profile", action="append", choices=list(PROFILES),
+        help=f"Client profile (network/CPU throttling) to run the suites under, repeat for several (default: {DEFAULT_PROFILE})",
+    )
+    parser.addoption(
+        "--network-mode", default="live", choices=["live", "record", "replay"],
+        help="live, record (save each run's traffic to a HAR) or replay (serve it from the recorded HAR)",
+    )
+    parser.addoption(
+        "--replay-timing", default="1", type=parse_timing,
+        help='Replay: scale of the recorded response times (1 = original, 0.1 = 10x faster) or "instant"',
+    )
+    parser.addoption(
+        "--metrics-port", type=int, default=metrics.METRICS_PORT,
+        help="Serve live OpenMetrics on http://127.0.0.1:<port>/metrics while the suites run",
+    )
+    parser.addoption(
+        "--metrics-textfile", default=metrics.METRICS_TEXTFILE,
+        help="Rewrite this file (*.prom) with the metrics in the Prometheus text format every few seconds "
+             "(node_exporter textfile collector)",
+    )
+
+def pytest_generate_tests(metafunc):
+    """Run every test once per selected client profile."""
+    if "client_profile" in metafunc.fixturenames:
+        profiles = metafunc.config.getoption("client_profile") or [DEFAULT_PROFILE]
+        metafunc.parametrize("client_profile", profiles)
+
+@pytest.fixture(scope="session")
+def harness(playwright, pytestconfig):
+    """One browser and one login per BASE_URL for every suite collected in this pytest session."""
+    load_input_data() # A missing input folder or a broken input.json fails here, as a fixture error
+    exporter = metrics.Exporter(pytestconfig.getoption("metrics_port"), pytestconfig.getoption("metrics_textfile"))
+    h = Harness(playwright)
+    yield h
+    h.close()
+    exporter.close()
+
+@pytest.fixture
+def variant(request, client_profile):
+    """Turn a suite's SCENARIO into the variant selected on the command line (client profile, network mode)."""
+    network = request.config.getoption("network_mode")
+    timing = request.config.getoption("replay_timing")
+    return lambda scenario: scenario.with_profile(client_profile).with_network(network, timing)
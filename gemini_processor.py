@@ -1,4 +1,4 @@
-﻿import google.generativeai as genai
+﻿import threading
 import time
 import os
 from pathlib import Path
@@ -7,7 +7,31 @@ from pathlib import Path
 DEFAULT_MODEL_NAME = "gemini-pro-latest"
 # ========================================================================================= #
 
+_genai = None
+_genai_lock = threading.Lock()
+_configured_key = None
+
+def load_genai():
+    """Import google.generativeai on first use; the SDK takes seconds to import."""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            _genai = genai
+    return _genai
+
+def configure(api_key_string):
+    """Import and configure the SDK once per API key. Safe to call from a background thread."""
+    global _configured_key
+    genai = load_genai()
+    with _genai_lock:
+        if _configured_key != api_key_string:
+            genai.configure(api_key=api_key_string)
+            _configured_key = api_key_string
+    return genai
+
 def upload_and_wait(path):
+    genai = load_genai()
     print(f"Uploading {Path(path).name}...")
     file_obj = genai.upload_file(path=path)
     while file_obj.state.name == "PROCESSING":
@@ -20,9 +44,33 @@ def upload_and_wait(path):
     print(f" > {Path(path).name} is ACTIVE")
     return file_obj
 
+def generate(uploaded_files, prompt_text, model_name=DEFAULT_MODEL_NAME):
+    """Send already uploaded files plus the prompt to one model; returns (cleaned text, token usage)."""
+    genai = load_genai()
+    model = genai.GenerativeModel(model_name)
+    response = model.generate_content(list(uploaded_files) + [prompt_text])
+    generated_text = response.text.strip()
+
+    # Clean the response
+    if generated_text.startswith("```json"):
+        json_start = generated_text.find('{')
+        json_end = generated_text.rfind('}')
+        if json_start != -1 and json_end != -1:
+            generated_text = generated_text[json_start : json_end + 1]
+    print("GEMINI RESPONSE RECEIVED.")
+    if not generated_text:
+         raise Exception("Failed to generate text from model.")
+    usage = getattr(response, "usage_metadata", None)
+    tokens = {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None),
+        "output_tokens": getattr(usage, "candidates_token_count", None),
+        "total_tokens": getattr(usage, "total_token_count", None),
+    }
+    return generated_text, tokens
+
 def process_documents(api_key_string, file_paths_list, prompt_text, model_name=DEFAULT_MODEL_NAME):
     # 1. Configuration
-    genai.configure(api_key=api_key_string)
+    genai = configure(api_key_string)
     if not file_paths_list:
         raise Exception("No file paths provided for processing.")
     print(f"Starting to process {len(file_paths_list)} specific files...")
@@ -42,21 +90,7 @@ def process_documents(api_key_string, file_paths_list, prompt_text, model_name=D
 
         # 3. Generate Content
         print(f"All {len(uploaded_files)} files ACTIVE. Sending prompt to Gemini...")
-        content_parts = uploaded_files + [prompt_text]
-        
-        model = genai.GenerativeModel(model_name)
-        response = model.generate_content(content_parts)
-        generated_text = response.text.strip()
-        
-        # Clean the response
-        if generated_text.startswith("```json"):
-            json_start = generated_text.find('{')
-            json_end = generated_text.rfind('}')
-            if json_start != -1 and json_end != -1:
-                generated_text = generated_text[json_start : json_end + 1]
-        print("GEMINI RESPONSE RECEIVED.")
-        if not generated_text:
-             raise Exception("Failed to generate text from model.")
+        generated_text, _ = generate(uploaded_files, prompt_text, model_name)
         return generated_text
 
     # 4. Cleanup
@@ -0,0 +1,122 @@
+import base64
+import json
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+# ===================================== CONFIGURATION ===================================== #
+REPLAY_NOT_FOUND = "abort" # Requests missing from the HAR: "abort" (fully offline) or "fallback" (go to the network)
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"} # Bodies in the HAR are already decoded
+# ========================================================================================= #
+
+def parse_timing(value: str) -> float | None:
+    """Replay timing option: a scale factor for the recorded response times, or "instant"."""
+    return None if value == "instant" else float(value)
+
+def har_file(har_dir: Path, unit) -> Path:
+    return har_dir / f"{unit.tag}.har"
+
+def state_file(har_path: Path) -> Path:
+    return har_path.with_suffix(".state.json")
+
+def record_options(har_dir: Path, unit) -> dict:
+    """new_context options that record the run's traffic (written when the context closes)."""
+    har_dir.mkdir(parents=True, exist_ok=True)
+    return {"record_har_path": str(har_file(har_dir, unit)), "record_har_content": "embed", "record_har_mode": "full"}
+
+def finish_recording(context, har_dir: Path, unit) -> None:
+    """Keep the session's storage state next to the HAR so the replay starts logged in."""
+    try:
+        context.storage_state(path=str(state_file(har_file(har_dir, unit))))
+    except Exception as e:
+        print(f"  [WARNING] Could not save storage state for the HAR replay: {e}")
+
+def find_recording(har_dir: Path, unit) -> Path:
+    """The unit's own recording, else the newest recording of the suite."""
+    path = har_file(har_dir, unit)
+    if path.exists():
+        return path
+    recordings = sorted(har_dir.glob("*.har"), key=lambda p: p.stat().st_mtime) if har_dir.exists() else []
+    if not recordings:
+        raise FileNotFoundError(f"No HAR recording in {har_dir}, record one first (network mode 'record').")
+    print(f"  [WARNING] No HAR recorded for {unit.tag}, replaying {recordings[-1].name}")
+    return recordings[-1]
+
+def _strip_query(url: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+
+class HarReplayer:
+    """Serves a recorded HAR with each response delayed by its recorded time x `timing_scale`.
+
+    Entries are matched on method + URL + request body, then method + URL, then method + URL without
+    the query string, and served in recorded order; each entry is served once, whichever key matched it,
+    and only when every match of a key is used up does its last one repeat. Repeated status polls
+    therefore replay the same "processing ... done" sequence as the recording.
+    """
+
+    def __init__(self, har_path: Path, timing_scale: float):
+        self.timing_scale = timing_scale
+        self.served = 0
+        self.missed = 0
+        self._index = {} # key -> positions of its entries, in recorded order
+        self._cursor = {} # key -> first position that may still be unused
+        with open(har_path, encoding="utf-8") as f:
+            self._entries = json.load(f)["log"]["entries"]
+        self._used = [False] * len(self._entries) # Shared by all three keys of an entry
+        for position, entry in enumerate(self._entries):
+            request = entry["request"]
+            body = (request.get("postData") or {}).get("text")
+            for key in ((request["method"], request["url"], body), (request["method"], request["url"]),
+                        (request["method"], _strip_query(request["url"]))):
+                self._index.setdefault(key, []).append(position)
+
+    def _next_entry(self, request):
+        for key in ((request.method, request.url, request.post_data), (request.method, request.url),
+                    (request.method, _strip_query(request.url))):
+            positions = self._index.get(key)
+            if not positions:
+                continue
+            cursor = self._cursor.get(key, 0)
+            while cursor < len(positions) and self._used[positions[cursor]]:
+                cursor += 1
+            self._cursor[key] = cursor
+            if cursor == len(positions):
+                return self._entries[positions[-1]]
+            self._used[positions[cursor]] = True
+            return self._entries[positions[cursor]]
+        return None
+
+    def handle(self, route, request) -> None:
+        entry = self._next_entry(request)
+        if entry is None:
+            self.missed += 1
+            if REPLAY_NOT_FOUND == "fallback":
+                route.fallback()
+            else:
+                route.abort()
+            return
+        delay_ms = max(0.0, entry.get("time", 0)) * self.timing_scale
+        if delay_ms > 0:
+            try:
+                # Waiting through the page keeps the event loop (and the other requests) running
+                request.frame.page.wait_for_timeout(delay_ms)
+            except Exception:
+                pass # Service worker or detached frame, serve without delay
+        response = entry["response"]
+        content = response.get("content", {})
+        text = content.get("text", "")
+        body = base64.b64decode(text) if content.get("encoding") == "base64" else text.encode("utf-8")
+        headers = {h["name"]: h["value"] for h in response.get("headers", [])
+                   if h["name"].lower() not in DROPPED_HEADERS and not h["name"].startswith(":")}
+        self.served += 1
+        route.fulfill(status=response["status"], headers=headers, body=body)
+
+def install_replay(context, har_path: Path, timing_scale: float | None):
+    """Serve the context's traffic from `har_path`: instantly (None) or with recorded timings x scale."""
+    print(f"Replaying {har_path.name} ({'instant' if timing_scale is None else f'timings x{timing_scale:g}'})")
+    if timing_scale is None:
+        context.route_from_har(str(har_path), not_found=REPLAY_NOT_FOUND)
+        return None
+    replayer = HarReplayer(har_path, timing_scale)
+    context.route("**/*", replayer.handle)
+    return replayer
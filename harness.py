@@ -0,0 +1,415 @@
+import csv
+import functools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from playwright.sync_api import expect
+import gemini_processor
+import har_replay
+import run_history
+from input_corpus import TAGS_KEY, InputCorpus, file_sha256
+from output_store import OutputStore
+from timeout_policy import TimeoutPolicy
+
+# ==================================MANUAL CONFIGURATION ================================== #
+BASE_PROJECT_DIR = Path(r"C:\Users\Tony\project")
+HEADLESS = False # Run Chromium without a window
+RESUME_FROM_CHECKPOINT = True # Resume a failed run from its last saved file (Xplan result, downloads) on the next invocation
+# ========================================================================================= #
+
+INPUT_DIR = BASE_PROJECT_DIR / "input_files" # folder for input files
+JSON_PATH = INPUT_DIR / "input.json" # login + client data json
+HISTORY_DB = BASE_PROJECT_DIR / "output_files" / "run_history.sqlite" # Step timings shared by all suites
+STORE_DIR = BASE_PROJECT_DIR / "output_files" / "store" # Content-addressed downloads of all suites
+CORPUS_INDEX = BASE_PROJECT_DIR / "output_files" / "input_index.json" # Input file hashes kept between sessions
+ENVIRONMENTS_KEY = "environments" # input.json entry overriding email/password/protectedCode per base URL
+
+@functools.lru_cache(maxsize=None)
+def load_input_data() -> dict:
+    """Read input.json once (collection needs the client list, the harness needs the rest)."""
+    if not INPUT_DIR.exists() or not INPUT_DIR.is_dir():
+        raise FileNotFoundError(
+            f"Input folder not found: {INPUT_DIR}. Please create it and place files to upload."
+        )
+    with JSON_PATH.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+def format_bytes(size: int) -> str:
+    units = ["B", "KB", "MB", "GB", "TB"]
+    value = float(size)
+    idx = 0
+    while value >= 1024 and idx < len(units) - 1:
+        value /= 1024.0
+        idx += 1
+    precision = 1 if value < 10 and idx > 0 else 0
+    return f"{value:.{precision}f} {units[idx]}"
+
+def log_upload_report(files: list[Path]) -> None:
+    print(f"Uploading {len(files)} file(s):")
+    for index, file_path in enumerate(files, start=1):
+        size = file_path.stat().st_size
+        print(f" [{index}] {file_path.name} - {format_bytes(size)} - {file_path}")
+
+class SuiteReport:
+    """CSV report and run-history session of one suite."""
+
+    def __init__(self, scenario, session_id: int):
+        self.scenario = scenario
+        self.session_id = session_id
+        self.csv_path = scenario.csv_path
+        self._lock = threading.Lock()
+
+    def start(self, login_duration: float | None) -> None:
+        with self._lock, open(self.csv_path, mode='a', newline='', encoding='utf-8') as f:
+            w = csv.writer(f)
+            w.writerow([self.scenario.title])
+            w.writerow([])
+            w.writerow(["SUMMARY"])
+            if login_duration is None:
+                w.writerow(["Login duration (s)", "shared"])
+            else:
+                w.writerow(["Login duration (s)", f"{login_duration:.2f}"])
+
+    def login_failed(self) -> None:
+        with self._lock, open(self.csv_path, mode="a", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["Login failed, please check credentials and restart test."])
+
+    def add(self, result) -> None:
+        """Append one run's section to the CSV and store its timings in the run history."""
+        unit = result.unit
+        with self._lock, open(self.csv_path, mode='a', newline='', encoding='utf-8') as f:
+            w = csv.writer(f)
+            document = f" | Document: {unit.document}" if unit.document else ""
+            if unit.client_name is not None:
+                w.writerow([f"Client: {unit.client_name} | Run: {unit.run_number}{document}"])
+            else:
+                w.writerow([f"Run: {unit.run_number}{document}"])
+            w.writerow(["TIME PERFORMANCE"])
+            w.writerow(["Action", "Duration (s)"])
+            for row in result.time_data:
+                if row.get("attempt", 1) == 1 and row.get("in_total", True): # First-attempt latency only
+                    duration_val = "" if row["duration"] is None else f"{row['duration']:.2f}"
+                    w.writerow([row["action"], duration_val])
+
+            # Wall time of steps that ran in parallel tabs, whose own rows above overlap (not part of the total)
+            parallel = [row for row in result.time_data if "documents" in row and row.get("attempt", 1) == 1]
+            if parallel:
+                w.writerow([])
+                w.writerow(["PARALLEL DOCUMENTS"])
+                w.writerow(["Action", "Documents", "Wall time (s)"])
+                for row in parallel:
+                    w.writerow([row["action"], row["documents"],
+                                "" if row["duration"] is None else f"{row['duration']:.2f}"])
+
+            # Retried steps, kept apart from the first-attempt timings above
+            if result.retry_data:
+                w.writerow([])
+                w.writerow(["RETRIES"])
+                w.writerow(["Step", "Attempt", "Outcome", "Elapsed (s)", "Error"])
+                for r in result.retry_data:
+                    w.writerow([r["step"], r["attempt"], r["outcome"], f"{r['duration']:.2f}", r["error"]])
+                for row in result.time_data:
+                    if row.get("attempt", 1) > 1 and row.get("in_total", True):
+                        w.writerow([row["action"], row["attempt"], "timing", f"{row['duration']:.2f}", ""])
+
+            # Verification sub-section (group by document; document as subheader; accuracy on its own row)
+            if self.scenario.has_step("verify-gemini"):
+                w.writerow([])
+                w.writerow(["AUTO FILL PERFORMANCE"])
+                doc_groups = {}
+                for vrow in result.verification_rows:
+                    doc_groups.setdefault(vrow.get("document", ""), []).append(vrow)
+                for doc_name, acc in result.verification_accuracy.items():
+                    w.writerow([f"Document: {doc_name}"])
+                    w.writerow([f"Accuracy: {acc if acc is not None else 'N/A'}"])
+                    w.writerow(["error_type", "field_name", "correct_value"])
+                    for vrow in doc_groups.get(doc_name, []):
+                        w.writerow([
+                            vrow.get("error_type", ""),
+                            vrow.get("field_name", ""),
+                            vrow.get("correct_value", ""),
+                        ])
+                    w.writerow([])
+            # Workers, harness CPU and Chromium RSS while each step ran (sweeps sample them, see resources.py)
+            if any("concurrency" in row for row in result.time_data):
+                w.writerow([])
+                w.writerow(["STEP RESOURCES"])
+                w.writerow(["Action", "Workers", "Harness CPU (%)", "Chromium RSS (MB)"])
+                for row in result.time_data:
+                    if row.get("attempt", 1) == 1 and row.get("in_total", True) and "concurrency" in row:
+                        w.writerow([row["action"], row["concurrency"],
+                                    "" if row["harness_cpu"] is None else f"{row['harness_cpu']:.0f}",
+                                    "" if row["chromium_rss_mb"] is None else f"{row['chromium_rss_mb']:.0f}"])
+            if result.upload_data:
+                w.writerow([])
+                w.writerow(["UPLOAD THROUGHPUT"])
+                w.writerow(["File(s)", "Mode", "Bytes", "Duration (s)", "MB/s", "Error"])
+                for urow in result.upload_data:
+                    w.writerow(["; ".join(urow["files"]) or urow["url"], urow["mode"], urow["bytes"],
+                                "" if urow["duration"] is None else f"{urow['duration']:.2f}",
+                                "" if urow["mb_per_s"] is None else f"{urow['mb_per_s']:.2f}", urow["error"] or ""])
+            if result.stream_data:
+                w.writerow([])
+                w.writerow(["CHAT STREAMING"])
+                w.writerow(["Prompt", "First text (s)", "Completion (s)", "Characters", "Tokens/s (est.)"])
+                for srow in result.stream_data:
+                    rate = "" if srow["tokens_per_s"] is None else f"{srow['tokens_per_s']:.1f}"
+                    w.writerow([srow["prompt"][:200], f"{srow['first_text']:.2f}", f"{srow['completion']:.2f}",
+                                srow["chars"], rate])
+            if self.scenario.has_step("verify-docx"):
+                w.writerow([])
+                w.writerow([f"Tables in word export: {result.table_count if result.table_count is not None else 'N/A'}"])
+            w.writerow([])
+        run_history.record_steps(HISTORY_DB, self.session_id, result.time_data)
+        if unit.document is None: # Single-document units would skew the whole-unit estimates of the scheduler
+            run_history.record_unit(HISTORY_DB, self.session_id, unit.client_name, unit.run_number,
+                                    result.duration, result.failed, result.worker)
+        if result.verification_accuracy:
+            run_history.record_accuracies(
+                HISTORY_DB, self.session_id, unit.client_name,
+                {(unit.run_number, doc): acc for doc, acc in result.verification_accuracy.items()},
+            )
+        print(f"Performance data appended to {self.csv_path.name}")
+
+    def resources(self, summary: dict, concurrency: int, autotuned: bool) -> None:
+        """Append the session's concurrency and resource headroom to the CSV and the run history."""
+        if not summary.get("samples"):
+            return
+        with self._lock, open(self.csv_path, mode="a", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["RESOURCES"])
+            w.writerow([f"Concurrency: {concurrency}{' (auto-tuned)' if autotuned else ''}"])
+            w.writerow([f"Harness CPU: mean {summary['mean_cpu_share'] * 100:.0f}%, peak "
+                        f"{summary['peak_cpu_share'] * 100:.0f}% of {summary['cores']} cores"])
+            w.writerow([f"CPU headroom: {summary['cpu_headroom'] * 100:.0f}%"])
+            w.writerow([f"Peak RSS: {summary['peak_rss_mb']:.0f} MB (chromium {summary['peak_chromium_rss_mb']:.0f} MB)"])
+            if summary["min_available_mb"] is not None:
+                w.writerow([f"Lowest free memory: {summary['min_available_mb']:.0f} MB"])
+            w.writerow([])
+        run_history.record_resources(HISTORY_DB, self.session_id, concurrency, autotuned, summary)
+
+    def finalize(self) -> None:
+        """Insert the success summary after the login block, counting every run section in the CSV."""
+        with self._lock:
+            if not self.csv_path.exists():
+                return
+            with open(self.csv_path, mode="r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            total_runs = 0
+            successful_runs = 0
+            total_time = 0.0
+            run_failed = None
+            for line in lines:
+                parts = line.split(",", 1)
+                if len(parts) == 2:
+                    try:
+                        total_time += float(parts[1])
+                    except ValueError:
+                        pass
+                if line.startswith(("Client:", "Run:")):
+                    if run_failed is False:
+                        successful_runs += 1
+                    total_runs += 1
+                    run_failed = False
+                elif line.startswith("FAILED at "):
+                    run_failed = True
+            if run_failed is False:
+                successful_runs += 1
+            success_rate = 100 * successful_runs / total_runs if total_runs else 0.0
+            first_run_idx = next(
+                (idx for idx, line in enumerate(lines) if line.startswith(("Client:", "Run:"))),
+                len(lines),
+            )
+            header_and_login = lines[:first_run_idx]
+            per_run_lines = lines[first_run_idx:]
+            summary_lines = [
+                f"Total runs,{total_runs}",
+                f"Successful runs,{successful_runs}",
+                f"Success rate,{success_rate:.2f}%",
+                f"Total time (s),{total_time:.2f}",
+                "",
+            ]
+            with open(self.csv_path, mode="w", encoding="utf-8", newline="") as f:
+                for line in header_and_login:
+                    f.write(line + "\n")
+                for line in summary_lines:
+                    f.write(line + "\n")
+                for line in per_run_lines:
+                    f.write(line + "\n")
+
+class Harness:
+    """Browser, logins and per-suite bookkeeping shared by every scenario run on one Playwright instance.
+
+    Suites only pay for one browser launch and one login per BASE_URL, however many suites run together.
+    Worker harnesses (see `worker`) get their own browser but share the logins, reports and caches.
+    """
+
+    def __init__(self, playwright, headless: bool = HEADLESS, name: str = "main"):
+        self.playwright = playwright
+        self.headless = headless
+        self.name = name
+        self.is_worker = False
+        self.reports = {} # suite -> SuiteReport
+        self.timeouts = {} # suite -> TimeoutPolicy
+        self.xplan_cache = {} # client ID -> {"path", "sha256"}
+        self.store = OutputStore(STORE_DIR)
+        self.corpora = {} # input folder -> InputCorpus, indexed once per session
+        self.shard = (0, 1) # (index, count) of the tagged inputs this harness runs
+        self.resources = None # ResourceMonitor of a sweep, adds CPU and RSS columns to step timings
+        self.on_step = None # Called with (unit, row) for every timing row as it is recorded (work queue workers)
+        self._browser = None
+        self._auth = {} # base_url -> storage_state, or the exception raised by the login
+        self._login_durations = {} # base_url -> seconds
+        self._gemini = None # Future of gemini_processor.configure
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.RLock() # Guards suite setup and logins shared with worker harnesses
+
+    def worker(self, playwright, name: str, shard: tuple[int, int] = (0, 1)) -> "Harness":
+        """Harness for another thread's Playwright instance, sharing this harness's logins and reports."""
+        h = Harness(playwright, self.headless, name)
+        h.is_worker = True
+        h.shard = shard
+        h.reports, h.timeouts, h.xplan_cache, h.store = self.reports, self.timeouts, self.xplan_cache, self.store
+        h.corpora, h.resources, h.on_step = self.corpora, self.resources, self.on_step
+        h._auth, h._login_durations = self._auth, self._login_durations
+        h._gemini, h._executor, h._lock = self._gemini, self._executor, self._lock
+        return h
+
+    @property
+    def browser(self):
+        if self._browser is None or not self._browser.is_connected():
+            self._browser = self.playwright.chromium.launch(headless=self.headless)
+        return self._browser
+
+    @property
+    def config(self) -> dict:
+        return load_input_data()
+
+    @property
+    def corpus(self) -> InputCorpus:
+        """Index of the input folder, built on first use and shared with the worker harnesses."""
+        return self.corpus_for(INPUT_DIR)
+
+    def corpus_for(self, directory: Path | None) -> InputCorpus:
+        """Index of another input folder (None = the input folder); only the input folder's hashes are cached."""
+        directory = directory or INPUT_DIR
+        with self._lock:
+            if directory not in self.corpora:
+                cache = CORPUS_INDEX if directory == INPUT_DIR else None
+                self.corpora[directory] = InputCorpus(directory, cache, load_input_data().get(TAGS_KEY)).build()
+            return self.corpora[directory]
+
+    def prepare(self, scenario) -> SuiteReport:
+        """First-use setup of a suite: folders, Gemini SDK, history session, CSV header and login."""
+        with self._lock:
+            return self._prepare(scenario)
+
+    def _prepare(self, scenario) -> SuiteReport:
+        if scenario.suite in self.reports:
+            return self.reports[scenario.suite]
+        self.setup(scenario)
+        report = SuiteReport(scenario, run_history.start_session(HISTORY_DB, scenario.base_url, scenario.suite))
+        if scenario.network == "replay": # Served from the HAR, no login against the backend
+            report.start(None)
+            self.reports[scenario.suite] = report
+            return report
+        first_login = scenario.base_url not in self._auth
+        self.auth_state(scenario, report)
+        login_duration = self._login_durations.get(scenario.base_url)
+        if first_login and login_duration is not None:
+            run_history.record_steps(HISTORY_DB, report.session_id, [{"run": 0, "action": "Login", "duration": login_duration}])
+        report.start(login_duration)
+        self.reports[scenario.suite] = report
+        return report
+
+    def setup(self, scenario) -> None:
+        """Folders, Gemini SDK and timeout policy of a suite, without a report (used alone by soak mode)."""
+        config = load_input_data()
+        scenario.output_dir.mkdir(parents=True, exist_ok=True)
+        scenario.ss_dir.mkdir(parents=True, exist_ok=True)
+        scenario.ss_err_dir.mkdir(parents=True, exist_ok=True)
+        if scenario.has_step("verify-gemini") and self._gemini is None:
+            # Import and configure the Gemini SDK in the background while the browser launches
+            self._gemini = self._executor.submit(gemini_processor.configure, config["gemini_api_key"])
+        if scenario.suite not in self.timeouts:
+            self.timeouts[scenario.suite] = TimeoutPolicy(HISTORY_DB, scenario.base_url, scenario.suite)
+
+    def auth_state(self, scenario, report: SuiteReport | None = None):
+        """Log in once per BASE_URL and return storage_state for reuse across runs and suites."""
+        with self._lock:
+            return self._login(scenario, report)
+
+    def _login(self, scenario, report: SuiteReport | None):
+        base_url = scenario.base_url
+        cached = self._auth.get(base_url)
+        if isinstance(cached, Exception):
+            raise cached
+        if cached is not None:
+            return cached
+        config = load_input_data()
+        config = {**config, **config.get(ENVIRONMENTS_KEY, {}).get(base_url, {})} # Per-environment credentials
+        context = self.browser.new_context()
+        page = context.new_page()
+        try:
+            # Locators for login
+            email_input = page.locator("input#email")
+            password_input = page.locator("input#password")
+            protected_input = page.locator("input#protectedCode")
+            sign_in_button = page.locator("button.brand-origin-btn", has_text="Sign in")
+            chat_input = page.locator("textarea.rce-input.rce-input-textarea")
+
+            # Proceed to login
+            page.goto(f"{base_url}/signin", wait_until="domcontentloaded")
+            expect(email_input).to_be_visible(timeout=10_000)
+            expect(password_input).to_be_visible(timeout=10_000)
+            email_input.fill(config["email"])
+            password_input.fill(config["password"])
+            if protected_input.is_visible():
+                protected_input.fill(config["protectedCode"])
+            expect(sign_in_button).to_be_visible(timeout=10_000)
+            expect(sign_in_button).to_be_enabled(timeout=10_000)
+            login_start = time.time()
+            sign_in_button.click()
+            expect(chat_input).to_be_visible(timeout=120_000)
+            self._login_durations[base_url] = time.time() - login_start
+            self._auth[base_url] = context.storage_state()
+            return self._auth[base_url]
+        except Exception as e:
+            print(f"Login failed. Error: {e}")
+            page.screenshot(path=str(scenario.ss_err_dir / "FAIL_Session_Login.png"))
+            if report is not None:
+                report.login_failed()
+            self._auth[base_url] = e
+            raise
+        finally:
+            context.close()
+
+    def new_context(self, scenario, unit=None):
+        """Authenticated context for a run; in record/replay network mode it records or replays the unit's HAR."""
+        if scenario.network == "replay":
+            har_path = har_replay.find_recording(scenario.har_recordings, unit)
+            state = har_replay.state_file(har_path)
+            context = self.browser.new_context(accept_downloads=True, storage_state=str(state) if state.exists() else None)
+            har_replay.install_replay(context, har_path, scenario.replay_timing)
+            return context
+        options = har_replay.record_options(scenario.har_recordings, unit) if scenario.network == "record" else {}
+        return self.browser.new_context(accept_downloads=True, storage_state=self.auth_state(scenario), **options)
+
+    def gemini_ready(self):
+        """Wait for the background Gemini configuration (raises if it failed)."""
+        if self._gemini is None:
+            self._gemini = self._executor.submit(gemini_processor.configure, load_input_data()["gemini_api_key"])
+        return self._gemini.result()
+
+    def close(self) -> None:
+        if not self.is_worker:
+            for report in self.reports.values():
+                report.finalize()
+        if self._browser is not None:
+            self._browser.close()
+            self._browser = None
+        if not self.is_worker:
+            self._executor.shutdown(wait=False)
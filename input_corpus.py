@@ -0,0 +1,189 @@
+import argparse
+import dataclasses
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# ===================================== CONFIGURATION ===================================== #
+TAGS_KEY = "file_tags" # input.json entry mapping file-name globs to tags, e.g. {"*.pst": ["email"]}
+RECURSIVE_SCAN = False # Also index the input folder's subfolders (their names become tags)
+RANK_MATCHES = False # Patterns prefer exact names, then prefixes, then substrings over recency, and skip picked content
+# ========================================================================================= #
+
+@dataclass
+class CorpusEntry:
+    """One input file with the content hash it was indexed under."""
+    path: Path
+    size: int
+    mtime_ns: int
+    sha256: str
+    tags: list = field(default_factory=list) # Subfolder names plus the globs of TAGS_KEY it matches
+    duplicates: list = field(default_factory=list) # Older paths with the same content
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+class InputCorpus:
+    """Index of the input folder, built once per session: path, size, mtime and SHA-256 of every file
+    (top level only unless `recursive`).
+
+    Hashes are kept in `cache_path` and only recomputed for files whose size or mtime changed.
+    Name lookups see every file; tags and shards list identical content once, under its newest path.
+    """
+
+    def __init__(self, root: Path, cache_path: Path | None = None, tag_globs: dict | None = None,
+                 recursive: bool = RECURSIVE_SCAN, ranked: bool = RANK_MATCHES):
+        self.root = root
+        self.cache_path = cache_path
+        self.tag_globs = tag_globs or {}
+        self.recursive = recursive
+        self.ranked = ranked
+        self.files = [] # Every file, newest first
+        self.entries = [] # Unique content, newest first
+        self.hashed = 0 # Files (re)hashed by the last build
+
+    def _scan(self):
+        stack = [self.root]
+        while stack:
+            with os.scandir(stack.pop()) as it:
+                for item in it:
+                    if item.name.startswith("."):
+                        continue
+                    if item.is_dir():
+                        if self.recursive:
+                            stack.append(Path(item.path))
+                    elif item.is_file():
+                        yield Path(item.path), item.stat()
+
+    def build(self) -> "InputCorpus":
+        if not self.root.exists():
+            raise FileNotFoundError(f"Folder not found: {self.root}")
+        cached = {}
+        if self.cache_path and self.cache_path.exists():
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        by_hash = {}
+        hashes = {}
+        self.hashed = 0
+        for path, st in self._scan():
+            key = str(path.relative_to(self.root))
+            known = cached.get(key)
+            if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+                sha = known["sha256"]
+            else:
+                sha = file_sha256(path)
+                self.hashed += 1
+            hashes[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha}
+            tags = list(path.relative_to(self.root).parts[:-1])
+            tags += [t for glob, globs_tags in self.tag_globs.items() if fnmatch.fnmatch(path.name.lower(), glob.lower())
+                     for t in globs_tags]
+            entry = CorpusEntry(path, st.st_size, st.st_mtime_ns, sha, list(dict.fromkeys(tags)))
+            by_hash.setdefault(sha, []).append(entry)
+        self.files = sorted((e for copies in by_hash.values() for e in copies), key=lambda e: e.mtime_ns, reverse=True)
+        self.entries = []
+        for copies in by_hash.values():
+            copies.sort(key=lambda e: e.mtime_ns, reverse=True)
+            newest = dataclasses.replace(copies[0], duplicates=[e.path for e in copies[1:]],
+                                         tags=list(dict.fromkeys(t for e in copies for t in e.tags)))
+            self.entries.append(newest)
+        self.entries.sort(key=lambda e: e.mtime_ns, reverse=True)
+        if not self.entries:
+            raise FileNotFoundError(f"No files found in {self.root}")
+        if self.cache_path:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump(hashes, f)
+        duplicates = sum(len(e.duplicates) for e in self.entries)
+        print(f"Indexed {len(self.entries)} input file(s) in {self.root.name}/ ({self.hashed} hashed, "
+              f"{duplicates} duplicate(s) skipped)")
+        return self
+
+    def find(self, pattern: str) -> list[CorpusEntry]:
+        """Files whose stem contains `pattern` (case-insensitive), newest first; ranked: exact stems, then prefixes."""
+        pattern = pattern.lower()
+        matches = [e for e in self.files if pattern in e.path.stem.lower()]
+        if not self.ranked:
+            return matches
+        rank = lambda e: 0 if e.path.stem.lower() == pattern else 1 if e.path.stem.lower().startswith(pattern) else 2
+        return sorted(matches, key=lambda e: (rank(e), -e.mtime_ns))
+
+    def tagged(self, tag: str) -> list[CorpusEntry]:
+        return [e for e in self.entries if tag in e.tags]
+
+    def select(self, patterns: list[str]) -> list[Path]:
+        """Newest match for each pattern, each file once. Ranked: best match, and content already taken by an
+        earlier pattern goes to the next candidate."""
+        print("Selecting files to upload...")
+        selected = {} # sha256 (ranked) or path -> path
+        for pattern in patterns:
+            matches = self.find(pattern)
+            candidates = [e for e in matches if e.sha256 not in selected] if self.ranked else matches
+            if not candidates:
+                if matches:
+                    print(f"  [WARNING] Pattern '{pattern}' only matches content already selected: {matches[0].name}")
+                else:
+                    print(f"  [WARNING] Could not find any file matching pattern: '{pattern}'")
+                continue
+            best = candidates[0]
+            selected[best.sha256 if self.ranked else best.path] = best.path
+            others = ", ".join(e.name for e in candidates[1:4])
+            note = f" (also matched: {others}{', ...' if len(candidates) > 4 else ''})" if others else ""
+            print(f"  > Found match for '{pattern}': {best.name}{note}")
+        if not selected:
+            raise FileNotFoundError("No valid files found from ANY of the required patterns.")
+        return list(selected.values())
+
+    @staticmethod
+    def shard(entries: list[CorpusEntry], index: int, count: int) -> list[CorpusEntry]:
+        """Entries of shard `index` of `count`, assigned by content hash: disjoint and the same on every host."""
+        if count <= 1:
+            return list(entries)
+        return [e for e in entries if int(e.sha256[:16], 16) % count == index]
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Shard option "i/n" (1-based) -> (index, count)."""
+    index, count = (int(part) for part in value.split("/"))
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Shard {value} is not between 1/{count} and {count}/{count}")
+    return index - 1, count
+
+def main(argv=None) -> int:
+    from harness import CORPUS_INDEX, INPUT_DIR, load_input_data
+    parser = argparse.ArgumentParser(description="Index the input folder and list its files, a tag or one shard.")
+    parser.add_argument("--tag", help="Only files with this tag")
+    parser.add_argument("--pattern", help="Only files matching this name pattern, best match first")
+    parser.add_argument("--shard", type=parse_shard, default=(0, 1), help="Shard i/n of the files (e.g. 2/4)")
+    parser.add_argument("--json", action="store_true", help="Print the entries as JSON")
+    parser.add_argument("--recursive", action="store_true", default=RECURSIVE_SCAN, help="Include subfolders")
+    parser.add_argument("--ranked", action="store_true", default=RANK_MATCHES,
+                        help="Order pattern matches exact > prefix > substring before recency")
+    args = parser.parse_args(argv)
+
+    corpus = InputCorpus(INPUT_DIR, CORPUS_INDEX, load_input_data().get(TAGS_KEY), args.recursive, args.ranked).build()
+    entries = corpus.find(args.pattern) if args.pattern else corpus.entries
+    if args.tag:
+        entries = [e for e in entries if args.tag in e.tags]
+    entries = corpus.shard(entries, *args.shard)
+    if args.json:
+        print(json.dumps([{**dataclasses.asdict(e), "path": str(e.path), "duplicates": [str(p) for p in e.duplicates]}
+                          for e in entries], indent=2))
+        return 0
+    for e in entries:
+        duplicates = f" (+{len(e.duplicates)} duplicate)" if e.duplicates else ""
+        print(f"{e.sha256[:12]} {e.size:>12} {str(e.path.relative_to(INPUT_DIR)):<60} {','.join(e.tags)}{duplicates}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
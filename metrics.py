@@ -0,0 +1,198 @@
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# ===================================== CONFIGURATION ===================================== #
+METRICS_HOST = "127.0.0.1" # Interface the /metrics endpoint listens on
+METRICS_PORT = None # Port of the /metrics endpoint (e.g. 9464), None = no endpoint
+METRICS_TEXTFILE = None # Path rewritten with the metrics (Prometheus text, node_exporter textfile collector), None = off
+TEXTFILE_INTERVAL_S = 15 # How often the textfile is rewritten
+STEP_BUCKETS_S = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 900, 1800) # Step latency histogram buckets
+# ========================================================================================= #
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+TEXTFILE_SUFFIX = ".prom" # The node_exporter textfile collector only reads *.prom files
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    def __init__(self, registry, name: str, kind: str, help_text: str, labels: tuple = (), unit: str | None = None):
+        self.name, self.kind, self.help, self.labels, self.unit = name, kind, help_text, labels, unit
+        self._lock = registry.lock
+        self._values = {} # label values -> value (histograms: [bucket counts, count, sum])
+        if not labels and kind != "histogram":
+            self._values[()] = 0 # Unlabelled series are exported from the start
+        registry.metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n) or "" for n in self.labels)
+
+    def render(self, openmetrics: bool = True) -> list[str]:
+        if openmetrics:
+            lines = [f"# TYPE {self.name} {self.kind}", f"# HELP {self.name} {_escape(self.help)}"]
+            if self.unit:
+                lines.append(f"# UNIT {self.name} {self.unit}")
+        else: # Prometheus 0.0.4: counters are declared under their _total name, no units
+            name = f"{self.name}_total" if self.kind == "counter" else self.name
+            help_text = self.help.replace("\\", "\\\\").replace("\n", "\\n")
+            lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {self.kind}"]
+        for key, value in sorted(self._values.items()):
+            lines.extend(self._samples(key, value))
+        return lines
+
+class Counter(_Metric):
+    def __init__(self, registry, name, help_text, labels=()):
+        super().__init__(registry, name, "counter", help_text, labels)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        with self._lock:
+            key = self._key(labels)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self, key, value):
+        return [f"{self.name}_total{_labels(self.labels, key)} {_number(value)}"]
+
+class Gauge(_Metric):
+    def __init__(self, registry, name, help_text, labels=()):
+        super().__init__(registry, name, "gauge", help_text, labels)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        with self._lock:
+            key = self._key(labels)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_labels(self.labels, key)} {_number(value)}"]
+
+class Histogram(_Metric):
+    def __init__(self, registry, name, help_text, labels=(), buckets=STEP_BUCKETS_S, unit=None):
+        super().__init__(registry, name, "histogram", help_text, labels, unit)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        with self._lock:
+            counts = self._values.setdefault(self._key(labels), [[0] * len(self.buckets), 0, 0.0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                counts[0][index] += 1
+            counts[1] += 1
+            counts[2] += value
+
+    def _samples(self, key, value):
+        buckets, count, total = value
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, buckets):
+            cumulative += n
+            le = 'le="%s"' % float(bound)
+            lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {count}")
+        lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def render(self, openmetrics: bool = True) -> str:
+        """Every metric in the OpenMetrics text format, or the Prometheus 0.0.4 text format (textfile collector)."""
+        with self.lock:
+            lines = [line for metric in self.metrics for line in metric.render(openmetrics)]
+        return "\n".join(lines + (["# EOF"] if openmetrics else [])) + "\n"
+
+REGISTRY = Registry()
+STEP_SECONDS = Histogram(REGISTRY, "faybl_step_duration_seconds", "Duration of timed steps",
+                         ("suite", "action", "client"), unit="seconds")
+RUNS_IN_FLIGHT = Gauge(REGISTRY, "faybl_runs_in_flight", "Runs currently executing", ("suite",))
+RUNS = Counter(REGISTRY, "faybl_runs", "Finished runs by outcome (passed/failed)", ("suite", "outcome"))
+STEP_FAILURES = Counter(REGISTRY, "faybl_step_attempt_failures", "Failed step attempts (retried or final)", ("suite",))
+GEMINI_IN_FLIGHT = Gauge(REGISTRY, "faybl_gemini_queue_depth", "Gemini verifications waiting for a response")
+CACHE_REQUESTS = Counter(REGISTRY, "faybl_cache_requests", "Cache lookups by cache and result (hit/miss)",
+                         ("cache", "result"))
+HARNESS_CPU = Gauge(REGISTRY, "faybl_harness_cpu_percent", "CPU of the harness processes in percent of one core",
+                    ("process",))
+HARNESS_RSS = Gauge(REGISTRY, "faybl_harness_rss_bytes", "Resident memory of the harness processes", ("process",))
+WORKERS = Gauge(REGISTRY, "faybl_workers", "Workers running units side by side")
+QUEUE_UNITS = Gauge(REGISTRY, "faybl_queue_units", "Units of the distributed sweep by state", ("state",))
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes would flood the run's output
+
+class Exporter:
+    """Serves REGISTRY on http://host:port/metrics and/or rewrites it to a textfile every TEXTFILE_INTERVAL_S."""
+
+    def __init__(self, port: int | None = METRICS_PORT, textfile: Path | None = METRICS_TEXTFILE,
+                 host: str = METRICS_HOST):
+        self.textfile = Path(textfile) if textfile else None
+        self._server = None
+        self._stop = threading.Event()
+        self._threads = []
+        if port:
+            self._server = ThreadingHTTPServer((host, port), _Handler)
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True))
+            print(f"Serving metrics on http://{host}:{port}/metrics")
+        if self.textfile:
+            self._threads.append(threading.Thread(target=self._write_loop, name="metrics-textfile", daemon=True))
+            print(f"Writing metrics to {self.textfile}")
+            if self.textfile.suffix != TEXTFILE_SUFFIX:
+                print(f"  [WARNING] The node_exporter textfile collector ignores files not ending in {TEXTFILE_SUFFIX}.")
+        for t in self._threads:
+            t.start()
+
+    def write_textfile(self) -> None:
+        """Write to a temporary file and rename it, so a collector never reads half a file."""
+        self.textfile.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.textfile.with_name(f".{self.textfile.name}.tmp")
+        tmp.write_text(REGISTRY.render(openmetrics=False), encoding="utf-8")
+        os.replace(tmp, self.textfile)
+
+    def _write_loop(self) -> None:
+        while not self._stop.wait(TEXTFILE_INTERVAL_S):
+            try:
+                self.write_textfile()
+            except OSError as e:
+                print(f"  [WARNING] Could not write metrics to {self.textfile}: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        if self.textfile:
+            self.write_textfile() # Final values
@@ -0,0 +1,194 @@
+import argparse
+import csv
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import gemini_processor
+from harness import BASE_PROJECT_DIR, STORE_DIR, load_input_data
+from output_store import OutputStore
+from run_history import parse_accuracy
+from scenario import parse_verification_rows
+
+# ===================================== CONFIGURATION ===================================== #
+BENCHMARK_MODELS = ["gemini-pro-latest", "gemini-flash-latest", "gemini-flash-lite-latest"] # Models compared
+REFERENCE_MODEL = gemini_processor.DEFAULT_MODEL_NAME # Verdicts of the other models are compared with this one
+AGREEMENT_THRESHOLD = 0.90 # Smallest mean agreement with the reference for a model to be recommended
+MAX_PAIRS = 10 # Most recent distinct (Xplan result, filled PDF) pairs taken from the output store
+MAX_CONCURRENCY = 4 # Gemini requests in flight at once
+PROMPT_SUITE = "test_prototype" # Suite whose pairs and GEMINI_PROMPT are benchmarked
+# ========================================================================================= #
+
+def stored_pairs(store: OutputStore, suite: str = PROMPT_SUITE, limit: int = MAX_PAIRS) -> list[tuple[Path, Path]]:
+    """(Xplan TXT, filled PDF) pairs of the suite's runs, newest first, each distinct content pair once."""
+    runs = {} # (suite, unit) -> {"txt": entry, "pdf": [entries]}
+    for e in store.entries():
+        if e.suite is None or not e.suite.startswith(suite) or not Path(e.path).exists():
+            continue
+        run = runs.setdefault((e.suite, e.unit), {"txt": None, "pdf": []})
+        if e.path.lower().endswith(".txt"):
+            run["txt"] = e
+        elif e.path.lower().endswith(".pdf"):
+            run["pdf"].append(e)
+    pairs, seen = [], set()
+    for run in sorted(runs.values(), key=lambda r: r["txt"].saved_at if r["txt"] else "", reverse=True):
+        if run["txt"] is None:
+            continue
+        for pdf in run["pdf"]:
+            key = (run["txt"].sha256, pdf.sha256)
+            if key not in seen:
+                seen.add(key)
+                pairs.append((Path(run["txt"].path), Path(pdf.path)))
+    return pairs[:limit]
+
+def flagged_fields(rows: list[dict]) -> set:
+    return {(r["error_type"], str(r["field_name"]).strip().lower()) for r in rows}
+
+def agreement(fields: set, reference: set) -> float:
+    """Jaccard overlap of the incorrect/empty fields two models flagged (1.0 when neither flagged any)."""
+    union = fields | reference
+    return len(fields & reference) / len(union) if union else 1.0
+
+def _call(model: str, pair_index: int, repeat: int, uploaded: list, prompt: str, document: str) -> dict:
+    start = time.perf_counter()
+    try:
+        text, tokens = gemini_processor.generate(uploaded, prompt, model)
+    except Exception as e:
+        return {"model": model, "pair": pair_index, "repeat": repeat, "latency": time.perf_counter() - start,
+                "error": str(e).splitlines()[0] if str(e) else type(e).__name__}
+    latency = time.perf_counter() - start
+    rows, accuracy = parse_verification_rows(None, repeat, text, document)
+    return {"model": model, "pair": pair_index, "repeat": repeat, "latency": latency, "error": None, **tokens,
+            "accuracy": parse_accuracy(accuracy), "parsed": accuracy != "N/A", "fields": flagged_fields(rows)}
+
+def run_benchmark(pairs: list[tuple[Path, Path]], models: list[str], prompt: str, repeats: int = 1,
+                  concurrency: int = MAX_CONCURRENCY) -> list[dict]:
+    """Upload every file once, then send each pair to every model `repeats` times, `concurrency` requests at a time.
+
+    Latency covers generate_content only, so upload and processing time don't blur the model comparison.
+    """
+    gemini_processor.configure(load_input_data()["gemini_api_key"])
+    uploaded = {}
+    try:
+        for path in dict.fromkeys(p for pair in pairs for p in pair):
+            uploaded[path] = gemini_processor.upload_and_wait(str(path))
+        print(f"\nSending {len(pairs)} pair(s) to {len(models)} model(s) x{repeats}, {concurrency} at a time...")
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(_call, model, i, repeat, [uploaded[txt], uploaded[pdf]], prompt, pdf.name)
+                       for repeat in range(1, repeats + 1) for i, (txt, pdf) in enumerate(pairs) for model in models]
+            return [f.result() for f in futures]
+    finally:
+        for file_obj in uploaded.values():
+            try:
+                gemini_processor.load_genai().delete_file(name=file_obj.name)
+            except Exception:
+                print(f"Could not delete {file_obj.display_name}.")
+
+def summarize(calls: list[dict], models: list[str], reference: str = REFERENCE_MODEL,
+              threshold: float = AGREEMENT_THRESHOLD) -> list[dict]:
+    """Latency, tokens, accuracy and agreement with the reference model's first answer for each pair."""
+    ref = {c["pair"]: c for c in calls if c["model"] == reference and c["repeat"] == 1 and c["error"] is None
+           and c["parsed"]}
+    summary = []
+    for model in models:
+        mine = [c for c in calls if c["model"] == model]
+        ok = [c for c in mine if c["error"] is None]
+        parsed = [c for c in ok if c["parsed"]]
+        # The reference's own first answers are skipped: with repeats its later answers show its self-agreement
+        compared = [c for c in parsed if c["pair"] in ref and not (model == reference and c["repeat"] == 1)]
+        latencies = sorted(c["latency"] for c in ok)
+        mean = lambda values: statistics.fmean(values) if values else None
+        accuracy_gaps = [abs(c["accuracy"] - ref[c["pair"]]["accuracy"]) for c in compared
+                         if c["accuracy"] is not None and ref[c["pair"]]["accuracy"] is not None]
+        agree = mean([agreement(c["fields"], ref[c["pair"]]["fields"]) for c in compared])
+        if model == reference and agree is None:
+            agree = 1.0
+        summary.append({
+            "model": model, "calls": len(mine), "errors": len(mine) - len(ok), "parse_failures": len(ok) - len(parsed),
+            "median_latency": statistics.median(latencies) if latencies else None,
+            "p90_latency": latencies[min(len(latencies) - 1, int(0.9 * len(latencies)))] if latencies else None,
+            "prompt_tokens": mean([c["prompt_tokens"] for c in ok if c.get("prompt_tokens") is not None]),
+            "output_tokens": mean([c["output_tokens"] for c in ok if c.get("output_tokens") is not None]),
+            "accuracy": mean([c["accuracy"] for c in parsed if c["accuracy"] is not None]),
+            "accuracy_gap": mean(accuracy_gaps), "agreement": agree,
+            "within_threshold": agree is not None and agree >= threshold and not (len(mine) - len(parsed)),
+        })
+    return summary
+
+def recommend(summary: list[dict]) -> dict | None:
+    """Fastest model (median latency) whose verdicts stay within the agreement threshold."""
+    candidates = [s for s in summary if s["within_threshold"] and s["median_latency"] is not None]
+    return min(candidates, key=lambda s: s["median_latency"]) if candidates else None
+
+def _fmt(value, spec: str) -> str:
+    return "" if value is None else format(value, spec)
+
+def print_summary(summary: list[dict], reference: str, threshold: float) -> None:
+    print(f"\n{'Model':<28} {'Calls':>5} {'Err':>4} {'Median (s)':>10} {'p90 (s)':>8} {'In tok':>7} {'Out tok':>7} "
+          f"{'Acc %':>6} {'|dAcc|':>6} {'Agree':>6}")
+    for s in summary:
+        marker = " (reference)" if s["model"] == reference else "" if s["within_threshold"] else " below threshold"
+        print(f"{s['model'][:28]:<28} {s['calls']:>5} {s['errors'] + s['parse_failures']:>4} "
+              f"{_fmt(s['median_latency'], '.1f'):>10} {_fmt(s['p90_latency'], '.1f'):>8} "
+              f"{_fmt(s['prompt_tokens'], '.0f'):>7} {_fmt(s['output_tokens'], '.0f'):>7} {_fmt(s['accuracy'], '.1f'):>6} "
+              f"{_fmt(s['accuracy_gap'], '.1f'):>6} {_fmt(s['agreement'], '.2f'):>6}{marker}")
+    best = recommend(summary)
+    if best:
+        print(f"\nRecommended: {best['model']} (agreement {best['agreement']:.2f} >= {threshold:.2f}, "
+              f"median {best['median_latency']:.1f}s)")
+    else:
+        print(f"\nNo model reaches an agreement of {threshold:.2f} with {reference}.")
+
+def write_csv(path: Path, calls: list[dict], summary: list[dict], reference: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, mode="a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([f"GEMINI MODEL BENCHMARK (reference {reference}) - {datetime.now().isoformat(timespec='seconds')}"])
+        w.writerow(["Model", "Calls", "Errors", "Parse failures", "Median latency (s)", "p90 latency (s)",
+                    "Prompt tokens", "Output tokens", "Accuracy (%)", "Accuracy gap (pp)", "Agreement", "Within threshold"])
+        for s in summary:
+            w.writerow([s["model"], s["calls"], s["errors"], s["parse_failures"], _fmt(s["median_latency"], ".2f"),
+                        _fmt(s["p90_latency"], ".2f"), _fmt(s["prompt_tokens"], ".0f"), _fmt(s["output_tokens"], ".0f"),
+                        _fmt(s["accuracy"], ".2f"), _fmt(s["accuracy_gap"], ".2f"), _fmt(s["agreement"], ".3f"),
+                        "yes" if s["within_threshold"] else "no"])
+        w.writerow([])
+        w.writerow(["Model", "Pair", "Repeat", "Latency (s)", "Prompt tokens", "Output tokens", "Accuracy (%)",
+                    "Flagged fields", "Error"])
+        for c in calls:
+            w.writerow([c["model"], c["pair"] + 1, c["repeat"], f"{c['latency']:.2f}", c.get("prompt_tokens") or "",
+                        c.get("output_tokens") or "", _fmt(c.get("accuracy"), ".2f"),
+                        len(c["fields"]) if c.get("fields") is not None else "", c["error"] or ""])
+        w.writerow([])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare Gemini models on the same verification pairs: "
+                                                 "latency, tokens and agreement with a reference model.")
+    parser.add_argument("--models", default=",".join(BENCHMARK_MODELS), help="Comma-separated models")
+    parser.add_argument("--reference", default=REFERENCE_MODEL, help="Model whose verdicts count as correct")
+    parser.add_argument("--pair", nargs=2, action="append", metavar=("XPLAN_TXT", "FILLED_PDF"),
+                        help="Verification pair to use instead of the output store's latest pairs (repeatable)")
+    parser.add_argument("--max-pairs", type=int, default=MAX_PAIRS, help="Pairs taken from the output store")
+    parser.add_argument("--repeats", type=int, default=1, help="Requests per pair and model")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY, help="Requests in flight at once")
+    parser.add_argument("--threshold", type=float, default=AGREEMENT_THRESHOLD, help="Minimum mean agreement")
+    args = parser.parse_args(argv)
+
+    models = list(dict.fromkeys([args.reference] + [m.strip() for m in args.models.split(",") if m.strip()]))
+    pairs = [(Path(t), Path(p)) for t, p in args.pair] if args.pair else stored_pairs(OutputStore(STORE_DIR),
+                                                                                        limit=args.max_pairs)
+    if not pairs:
+        print(f"No (Xplan TXT, filled PDF) pairs of {PROMPT_SUITE} in the output store, run the suite or pass --pair.")
+        return 1
+    from test_prototype import GEMINI_PROMPT
+    calls = run_benchmark(pairs, models, GEMINI_PROMPT, args.repeats, args.concurrency)
+    summary = summarize(calls, models, args.reference, args.threshold)
+    print_summary(summary, args.reference, args.threshold)
+    bench_csv = BASE_PROJECT_DIR / "output_files" / "gemini_model_benchmark.csv"
+    write_csv(bench_csv, calls, summary, args.reference)
+    print(f"Benchmark results appended to {bench_csv.name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+
+# ===================================== CONFIGURATION ===================================== #
+LINK_MODE = "hardlink" # How run-named paths point at stored files: "hardlink", "symlink" or "copy"
+SKIP_IDENTICAL_CHECKS = False # Opt-in: reuse DOCX/Gemini check results for exports byte-identical to a checked one
+# ========================================================================================= #
+
+@dataclass
+class StoredFile:
+    """A download kept once under its SHA-256 and linked at its run-named path."""
+    path: str # Run-named path, e.g. output_files/<suite>/<name>_run3.docx
+    sha256: str
+    size: int
+    object: str # Stored copy under objects/<sha[:2]>/<sha><suffix>
+    duplicate_of: str | None = None # First run path with the same bytes, None for new content
+    suite: str | None = None
+    unit: str | None = None
+    name: str | None = None # Suggested file name of the download
+    saved_at: str | None = None
+
+class OutputStore:
+    """Content-addressed store for the suites' downloads, with a JSON Lines manifest.
+
+    Every download is moved into objects/ and hashed on the way (one pass over the bytes instead of
+    save_as's copy plus a second read to hash it); the usual run-named path becomes a link to the
+    stored object. The manifest also keeps results of checks keyed by content hash, so a check on a
+    byte-identical export can be skipped.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.objects_dir = root / "objects"
+        self.manifest_path = root / "manifest.jsonl"
+        self._lock = threading.Lock() # Worker threads save downloads concurrently
+        self._by_sha = None # sha256 -> first StoredFile
+        self._by_path = {} # run path -> latest StoredFile
+        self._results = {} # (kind, key) -> value
+
+    def _load(self) -> None:
+        if self._by_sha is not None:
+            return
+        self._by_sha = {}
+        if not self.manifest_path.exists():
+            return
+        with open(self.manifest_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "result" in record:
+                    self._results[(record["result"], record["key"])] = record["value"]
+                else:
+                    stored = StoredFile(**record)
+                    self._by_sha.setdefault(stored.sha256, stored)
+                    self._by_path[stored.path] = stored
+
+    def _append(self, record: dict) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, mode="a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _take(self, source: Path, target: Path) -> tuple[str, int]:
+        """Move `source` to `target` and hash it: a rename plus one read, or one copying pass across file systems."""
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            os.replace(source, target)
+            handle = open(target, "rb")
+            sink = None
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            handle, sink = open(source, "rb"), open(target, "wb")
+        with handle:
+            for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+                digest.update(chunk)
+                size += len(chunk)
+                if sink:
+                    sink.write(chunk)
+        if sink:
+            sink.close()
+            source.unlink(missing_ok=True)
+        return digest.hexdigest(), size
+
+    def put_download(self, download, dest: Path, suite: str | None = None, unit: str | None = None) -> StoredFile:
+        """Store a Playwright download and link it at `dest`."""
+        incoming = self.root / "incoming" / uuid.uuid4().hex
+        incoming.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            source = Path(download.path())
+        except Exception: # Remote browser: the file has to be streamed over the connection anyway
+            source = incoming.with_suffix(".part")
+            download.save_as(str(source))
+        sha, size = self._take(source, incoming)
+        with self._lock:
+            self._load()
+            previous = self._by_sha.get(sha)
+            if previous is not None and previous.path == str(dest): # Saved again by a retried step
+                previous = None
+            obj = self.objects_dir / sha[:2] / f"{sha}{dest.suffix}"
+            if obj.exists():
+                incoming.unlink()
+            else:
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(incoming, obj)
+            _link(obj, dest)
+            stored = StoredFile(str(dest), sha, size, str(obj), previous.path if previous else None, suite, unit,
+                                download.suggested_filename, datetime.now().isoformat(timespec="seconds"))
+            self._by_sha.setdefault(sha, stored)
+            self._by_path[stored.path] = stored
+            self._append(asdict(stored))
+        return stored
+
+    def entries(self) -> list[StoredFile]:
+        """Latest manifest entry of every run-named path."""
+        with self._lock:
+            self._load()
+            return list(self._by_path.values())
+
+    def entry(self, path: Path) -> StoredFile | None:
+        """Manifest entry of a run-named path, None if it wasn't saved through the store."""
+        with self._lock:
+            self._load()
+            return self._by_path.get(str(path))
+
+    def result(self, kind: str, key: str):
+        """Value remembered for a check of content `key`, None if it was never run."""
+        with self._lock:
+            self._load()
+            return self._results.get((kind, key))
+
+    def remember(self, kind: str, key: str, value) -> None:
+        with self._lock:
+            self._load()
+            self._results[(kind, key)] = value
+            self._append({"result": kind, "key": key, "value": value})
+
+def _link(obj: Path, dest: Path) -> None:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists() or dest.is_symlink(): # Left by an earlier attempt of the step
+        dest.unlink()
+    if LINK_MODE == "hardlink":
+        try:
+            os.link(obj, dest)
+            return
+        except OSError:
+            pass # Other volume or no hard link support, fall back to a symlink
+    if LINK_MODE in ("hardlink", "symlink"):
+        try:
+            os.symlink(obj.resolve(), dest)
+            return
+        except OSError:
+            pass # Windows without the symlink privilege
+    shutil.copyfile(obj, dest)
@@ -0,0 +1,321 @@
+import csv
+import os
+import statistics
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+import metrics
+
+# ===================================== CONFIGURATION ===================================== #
+SAMPLE_INTERVAL_S = 2.0 # How often CPU and RSS of the harness processes are sampled
+CPU_SATURATION = 0.80 # Harness CPU (share of all cores) at which auto-tune stops adding workers
+LATENCY_INFLATION_LIMIT = 0.25 # Median step slowdown vs the single-worker level at which auto-tune stops adding workers
+AUTOTUNE_MAX_WORKERS = 8 # Auto-tune never goes beyond this many workers
+AUTOTUNE_MIN_STEPS = 8 # Timed steps a level needs before auto-tune judges it
+# ========================================================================================= #
+
+GROUPS = ("python", "driver", "chromium") # This process (harness and worker threads), Playwright driver, browsers
+
+def _proc_stat(pid: int) -> list[str] | None:
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return data[data.rfind(")") + 2:].split() # Fields after the command name, which may contain spaces
+
+def _proc_name(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/comm", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def process_tree(pid: int) -> dict[int, str]:
+    """pid -> process name of `pid` and all its descendants (psutil if installed, else /proc), {} if unavailable."""
+    try:
+        import psutil
+        root = psutil.Process(pid)
+        tree = {}
+        for p in [root] + root.children(recursive=True):
+            try:
+                tree[p.pid] = p.name()
+            except psutil.Error:
+                pass
+        return tree
+    except ImportError:
+        pass
+    except Exception:
+        return {}
+    if not os.path.isdir("/proc"):
+        return {}
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            stat = _proc_stat(int(entry))
+            if stat:
+                children.setdefault(int(stat[1]), []).append(int(entry))
+    tree, stack = {}, [pid]
+    while stack:
+        current = stack.pop()
+        tree[current] = _proc_name(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+def cpu_seconds(pid: int) -> float | None:
+    """User plus system CPU time a process has used, None if unavailable."""
+    try:
+        import psutil
+        times = psutil.Process(pid).cpu_times()
+        return times.user + times.system
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    stat = _proc_stat(pid)
+    if not stat:
+        return None
+    return (int(stat[11]) + int(stat[12])) / os.sysconf("SC_CLK_TCK")
+
+def process_rss(pid: int) -> int | None:
+    """Resident set size of a process in bytes (psutil if installed, else /proc), None if unavailable."""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+def available_memory_mb() -> float | None:
+    try:
+        import psutil
+        return psutil.virtual_memory().available / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+def process_group(pid: int, name: str, own_pid: int) -> str:
+    if pid == own_pid:
+        return "python"
+    name = name.lower()
+    if "chrom" in name or "headless_shell" in name:
+        return "chromium"
+    return "driver" if "node" in name or "playwright" in name else "python"
+
+class ResourceMonitor:
+    """Samples CPU and RSS of this Python process and every process it started (Playwright driver, Chromium)
+    every SAMPLE_INTERVAL_S, in a background thread. CPU is in percent of one core, like top."""
+
+    def __init__(self, interval_s: float = SAMPLE_INTERVAL_S, pid: int | None = None):
+        self.interval_s = interval_s
+        self.pid = pid or os.getpid()
+        self.cores = os.cpu_count() or 1
+        self.concurrency = 1 # Workers running units, set by the scheduler
+        self.samples = []
+        self._cpu = {} # pid -> CPU seconds at the previous sample
+        self._last = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.available = bool(process_tree(self.pid))
+        if not self.available:
+            print("  [WARNING] Process information unavailable (install psutil), resources are not sampled.")
+            return
+        self.sample() # CPU baseline
+        self._thread = threading.Thread(target=self._loop, name="resource-monitor", daemon=True)
+        self._thread.start()
+
+    def sample(self) -> dict:
+        now = time.time()
+        tree = process_tree(self.pid)
+        cpu = {g: 0.0 for g in GROUPS}
+        rss = {g: 0 for g in GROUPS}
+        chromium = 0
+        seen = {}
+        for pid, name in tree.items():
+            group = process_group(pid, name, self.pid)
+            chromium += group == "chromium"
+            used = cpu_seconds(pid)
+            if used is not None:
+                seen[pid] = used
+                if self._last is not None and pid in self._cpu:
+                    cpu[group] += max(0.0, used - self._cpu[pid])
+            rss[group] += process_rss(pid) or 0
+        elapsed = now - self._last if self._last is not None else None
+        row = {"at": now, "concurrency": self.concurrency, "chromium_processes": chromium,
+               "available_mb": available_memory_mb()}
+        for g in GROUPS:
+            row[f"{g}_cpu"] = 100 * cpu[g] / elapsed if elapsed else None
+            row[f"{g}_rss_mb"] = rss[g] / 2**20
+        row["cpu"] = sum(row[f"{g}_cpu"] for g in GROUPS) if elapsed else None
+        row["cpu_share"] = row["cpu"] / (100 * self.cores) if elapsed else None
+        row["rss_mb"] = sum(rss.values()) / 2**20
+        with self._lock:
+            self._cpu, self._last = seen, now
+            if elapsed:
+                self.samples.append(row)
+        for g in GROUPS:
+            if elapsed:
+                metrics.HARNESS_CPU.set(row[f"{g}_cpu"], process=g)
+            metrics.HARNESS_RSS.set(rss[g], process=g)
+        return row
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"  [WARNING] Resource sample failed: {e}")
+
+    def latest(self) -> dict | None:
+        with self._lock:
+            return self.samples[-1] if self.samples else None
+
+    def since(self, start: float) -> list[dict]:
+        with self._lock:
+            return [s for s in self.samples if s["at"] >= start]
+
+    def step_fields(self) -> dict:
+        """Resource columns written next to a step timing: workers running, harness CPU and Chromium RSS."""
+        latest = self.latest()
+        return {"concurrency": self.concurrency,
+                "harness_cpu": None if latest is None else latest["cpu"],
+                "chromium_rss_mb": None if latest is None else latest["chromium_rss_mb"]}
+
+    def summary(self, start: float | None = None) -> dict:
+        """Mean and peak CPU, peak RSS per group, and the headroom left on the machine."""
+        samples = self.samples if start is None else self.since(start)
+        if not samples:
+            return {"samples": 0}
+        shares = [s["cpu_share"] for s in samples]
+        memory = [s["available_mb"] for s in samples if s["available_mb"] is not None]
+        result = {"samples": len(samples), "cores": self.cores,
+                  "mean_cpu_share": statistics.fmean(shares), "peak_cpu_share": max(shares),
+                  "cpu_headroom": 1 - max(shares), "peak_rss_mb": max(s["rss_mb"] for s in samples),
+                  "min_available_mb": min(memory) if memory else None,
+                  "peak_chromium_processes": max(s["chromium_processes"] for s in samples)}
+        for g in GROUPS:
+            result[f"mean_{g}_cpu"] = statistics.fmean(s[f"{g}_cpu"] for s in samples)
+            result[f"peak_{g}_rss_mb"] = max(s[f"{g}_rss_mb"] for s in samples)
+        return result
+
+    def close(self) -> None:
+        self._stop.set()
+
+class AutoTuner:
+    """Adds a worker while the harness has CPU headroom and step latency stays close to the single-worker level,
+    then holds the last level that stayed within both limits."""
+
+    def __init__(self, monitor: ResourceMonitor, max_workers: int = AUTOTUNE_MAX_WORKERS,
+                 cpu_limit: float = CPU_SATURATION, inflation_limit: float = LATENCY_INFLATION_LIMIT,
+                 min_steps: int = AUTOTUNE_MIN_STEPS):
+        self.monitor = monitor
+        self.max_workers = max_workers
+        self.cpu_limit = cpu_limit
+        self.inflation_limit = inflation_limit
+        self.min_steps = min_steps
+        self.level = 1
+        self.held = False
+        self.levels = [] # One entry per judged level: workers, cpu share, inflation, decision
+        self._durations = {} # level -> {(suite, action): [durations]}
+        self._level_start = time.time()
+        monitor.concurrency = 1
+
+    def observe(self, suite: str, time_data: list[dict]) -> None:
+        """Keep the first-attempt step timings of a finished unit under the level they were measured at."""
+        for row in time_data:
+            if row.get("attempt", 1) == 1 and row["duration"] is not None and "concurrency" in row:
+                by_action = self._durations.setdefault(row["concurrency"], {})
+                by_action.setdefault((suite, row["action"].strip()), []).append(row["duration"])
+
+    def inflation(self, level: int) -> float | None:
+        """Median over steps of (median duration at `level` / median duration with one worker) - 1."""
+        baseline, current = self._durations.get(1, {}), self._durations.get(level, {})
+        ratios = [statistics.median(values) / statistics.median(baseline[key]) for key, values in current.items()
+                  if key in baseline and statistics.median(baseline[key]) > 0]
+        return statistics.median(ratios) - 1 if ratios else None
+
+    def decide(self) -> int:
+        """Workers to run from now on."""
+        steps = sum(len(v) for v in self._durations.get(self.level, {}).values())
+        if self.held or steps < self.min_steps:
+            return self.level
+        window = self.monitor.summary(self._level_start)
+        cpu = window.get("mean_cpu_share")
+        inflation = self.inflation(self.level) if self.level > 1 else 0.0
+        saturated = cpu is not None and cpu >= self.cpu_limit
+        inflated = inflation is not None and inflation >= self.inflation_limit
+        entry = {"workers": self.level, "cpu_share": cpu, "inflation": inflation, "steps": steps}
+        if saturated or inflated:
+            reason = "CPU saturated" if saturated else "latency inflated"
+            self.held = True
+            if self.level > 1:
+                self.level -= 1
+            entry["decision"] = f"{reason}, holding {self.level}"
+        elif self.level >= self.max_workers:
+            self.held = True
+            entry["decision"] = f"at the maximum, holding {self.level}"
+        else:
+            self.level += 1
+            self._level_start = time.time()
+            entry["decision"] = f"adding a worker ({self.level})"
+        self.levels.append(entry)
+        cpu_text = "n/a" if cpu is None else f"{cpu * 100:.0f}%"
+        inflation_text = "n/a" if inflation is None else f"{inflation * 100:+.0f}%"
+        print(f"\n[AUTO-TUNE] {entry['workers']} worker(s): harness CPU {cpu_text} of {self.monitor.cores} cores, "
+              f"step latency {inflation_text} vs 1 worker -> {entry['decision']}")
+        self.monitor.concurrency = self.level
+        metrics.WORKERS.set(self.level)
+        return self.level
+
+def print_resources(summary: dict, concurrency: int, autotune: AutoTuner | None = None) -> None:
+    if not summary.get("samples"):
+        print("\nResources: no samples")
+        return
+    chosen = f"{concurrency} (auto-tuned)" if autotune else str(concurrency)
+    available = "n/a" if summary["min_available_mb"] is None else f"{summary['min_available_mb']:.0f} MB"
+    print(f"\nConcurrency: {chosen}")
+    print(f"Harness CPU: mean {summary['mean_cpu_share'] * 100:.0f}%, peak {summary['peak_cpu_share'] * 100:.0f}% "
+          f"of {summary['cores']} cores (headroom {summary['cpu_headroom'] * 100:.0f}%)")
+    print(f"  python {summary['mean_python_cpu']:.0f}%, driver {summary['mean_driver_cpu']:.0f}%, "
+          f"chromium {summary['mean_chromium_cpu']:.0f}% of one core on average")
+    print(f"RSS: peak {summary['peak_rss_mb']:.0f} MB (chromium {summary['peak_chromium_rss_mb']:.0f} MB in up to "
+          f"{summary['peak_chromium_processes']} processes), lowest free memory {available}")
+
+def write_samples(path: Path, samples: list[dict], concurrency: int, autotune: AutoTuner | None = None) -> None:
+    """Append the sweep's resource time series (and the auto-tune decisions) to a CSV."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, mode="a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([f"SWEEP RESOURCES - {datetime.now().isoformat(timespec='seconds')} - concurrency {concurrency}"
+                    f"{' (auto-tuned)' if autotune else ''}"])
+        if autotune:
+            w.writerow(["Workers", "Harness CPU share", "Latency inflation", "Steps", "Decision"])
+            for level in autotune.levels:
+                w.writerow([level["workers"], "" if level["cpu_share"] is None else f"{level['cpu_share']:.3f}",
+                            "" if level["inflation"] is None else f"{level['inflation']:+.3f}", level["steps"],
+                            level["decision"]])
+            w.writerow([])
+        columns = ["concurrency", "cpu", "cpu_share", "rss_mb"] + [f"{g}_{m}" for g in GROUPS for m in ("cpu", "rss_mb")]
+        w.writerow(["Time"] + columns + ["chromium_processes", "available_mb"])
+        for sample in samples:
+            values = [sample[c] for c in columns] + [sample["chromium_processes"], sample["available_mb"]]
+            w.writerow([datetime.fromtimestamp(sample["at"]).isoformat(timespec="seconds")]
+                       + ["" if v is None else f"{v:.3f}" if isinstance(v, float) else v for v in values])
+        w.writerow([])
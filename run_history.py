@@ -0,0 +1,393 @@
+import argparse
+import itertools
+import json
+import math
+import platform
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# ===================================== CONFIGURATION ===================================== #
+BASELINE_SESSIONS = 10 # Number of previous sessions that form the rolling baseline
+REGRESSION_THRESHOLD = 0.20 # Flag actions whose median latency grew by more than this fraction
+SIGNIFICANCE_LEVEL = 0.05 # p-value below which a latency increase counts as significant
+EXACT_TEST_LIMIT = 50_000 # Use the exact rank test while the number of permutations stays below this
+# ========================================================================================= #
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    base_url TEXT NOT NULL,
+    suite TEXT NOT NULL,
+    git_revision TEXT,
+    environment TEXT
+);
+CREATE TABLE IF NOT EXISTS steps (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    client TEXT,
+    run INTEGER,
+    action TEXT NOT NULL,
+    duration REAL,
+    recorded_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS accuracies (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    client TEXT,
+    run INTEGER,
+    document TEXT,
+    accuracy REAL
+);
+CREATE TABLE IF NOT EXISTS units (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    client TEXT,
+    run INTEGER,
+    duration REAL NOT NULL,
+    failed INTEGER NOT NULL,
+    worker TEXT
+);
+CREATE TABLE IF NOT EXISTS resources (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    concurrency INTEGER NOT NULL,
+    autotuned INTEGER NOT NULL,
+    mean_cpu_share REAL,
+    peak_cpu_share REAL,
+    peak_rss_mb REAL,
+    min_available_mb REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_key ON sessions(base_url, suite, id);
+CREATE INDEX IF NOT EXISTS idx_steps_action ON steps(action, session_id);
+"""
+
+def default_db_path() -> Path:
+    """The database the suites write to (harness.HISTORY_DB), so BASE_PROJECT_DIR is the only project path to edit."""
+    from harness import HISTORY_DB # harness imports this module, so only at call time
+    return HISTORY_DB
+
+def connect(db_path: Path | None = None) -> sqlite3.Connection:
+    db_path = Path(db_path or default_db_path())
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+def git_revision() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def environment_metadata() -> dict:
+    metadata = {
+        "host": socket.gethostname(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+    }
+    for package in ("playwright", "pytest"):
+        try:
+            from importlib.metadata import version
+            metadata[package] = version(package)
+        except Exception:
+            metadata[package] = None
+    return metadata
+
+def start_session(db_path: Path, base_url: str, suite: str) -> int:
+    """Create a session row for one suite invocation and return its id."""
+    with connect(db_path) as conn:
+        cursor = conn.execute(
+            "INSERT INTO sessions (started_at, base_url, suite, git_revision, environment) VALUES (?, ?, ?, ?, ?)",
+            (datetime.now().isoformat(timespec="seconds"), base_url, suite,
+             git_revision(), json.dumps(environment_metadata())),
+        )
+        session_id = cursor.lastrowid
+    conn.close()
+    return session_id
+
+def record_steps(db_path: Path, session_id: int, time_data: list[dict]) -> None:
+    """Store the time_data rows collected by a suite (run, action, duration and optional client).
+
+    Rows from a retried attempt are stored under "<action> (attempt n)" so they never mix with
+    first-attempt latency.
+    """
+    now = datetime.now().isoformat(timespec="seconds")
+    rows = []
+    for row in time_data:
+        action = row["action"].strip()
+        if row.get("attempt", 1) > 1:
+            action = f"{action} (attempt {row['attempt']})"
+        rows.append((session_id, row.get("client"), row.get("run"), action, row.get("duration"), now))
+    with connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO steps (session_id, client, run, action, duration, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+    conn.close()
+
+def record_unit(db_path: Path, session_id: int, client: str | None, run: int, duration: float,
+                failed: bool, worker: str | None = None) -> None:
+    """Store the wall time of one whole run (login excluded), used to schedule later sweeps."""
+    with connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO units (session_id, client, run, duration, failed, worker) VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, client, run, duration, int(failed), worker),
+        )
+    conn.close()
+
+def record_resources(db_path: Path, session_id: int, concurrency: int, autotuned: bool, summary: dict) -> None:
+    """Store the workers a session ran with and the harness CPU/memory it used."""
+    with connect(db_path) as conn:
+        conn.execute(
+            "INSERT INTO resources (session_id, concurrency, autotuned, mean_cpu_share, peak_cpu_share, peak_rss_mb, "
+            "min_available_mb) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (session_id, concurrency, int(autotuned), summary["mean_cpu_share"], summary["peak_cpu_share"],
+             summary["peak_rss_mb"], summary["min_available_mb"]),
+        )
+    conn.close()
+
+def parse_accuracy(value) -> float | None:
+    try:
+        return float(str(value).strip().rstrip("%"))
+    except ValueError:
+        return None
+
+def record_accuracies(db_path: Path, session_id: int, client: str, accuracy_by_run_doc: dict) -> None:
+    """Store accuracies keyed by (run, document), as collected in test_prototype."""
+    rows = [
+        (session_id, client, run, document, parse_accuracy(acc))
+        for (run, document), acc in accuracy_by_run_doc.items()
+    ]
+    with connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO accuracies (session_id, client, run, document, accuracy) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+    conn.close()
+
+def action_durations(conn: sqlite3.Connection, action: str, session_ids: list[int]) -> list[float]:
+    if not session_ids:
+        return []
+    placeholders = ",".join("?" for _ in session_ids)
+    rows = conn.execute(
+        f"SELECT duration FROM steps WHERE action = ? AND duration IS NOT NULL AND session_id IN ({placeholders})",
+        [action, *session_ids],
+    ).fetchall()
+    return [row["duration"] for row in rows]
+
+def recent_durations(db_path: Path, base_url: str, suite: str, action: str, sessions: int) -> list[float]:
+    """Successful durations of one action over the last `sessions` sessions of a suite."""
+    conn = connect(db_path)
+    try:
+        session_ids = [row["id"] for row in conn.execute(
+            "SELECT id FROM sessions WHERE base_url = ? AND suite = ? ORDER BY id DESC LIMIT ?",
+            (base_url, suite, sessions),
+        )]
+        return action_durations(conn, action, session_ids)
+    finally:
+        conn.close()
+
+def recent_unit_durations(db_path: Path, base_url: str, suite: str, sessions: int,
+                          client: str | None = None) -> list[float]:
+    """Wall times of successful runs over the last `sessions` sessions of a suite, optionally for one client.
+
+    Sessions recorded before run wall times were stored fall back to the sum of each run's step durations.
+    """
+    conn = connect(db_path)
+    try:
+        session_ids = [row["id"] for row in conn.execute(
+            "SELECT id FROM sessions WHERE base_url = ? AND suite = ? ORDER BY id DESC LIMIT ?",
+            (base_url, suite, sessions),
+        )]
+        if not session_ids:
+            return []
+        placeholders = ",".join("?" for _ in session_ids)
+        client_filter = "" if client is None else " AND client = ?"
+        params = [*session_ids] + ([] if client is None else [client])
+        durations = [row["duration"] for row in conn.execute(
+            f"SELECT duration FROM units WHERE failed = 0 AND session_id IN ({placeholders}){client_filter}",
+            params,
+        )]
+        if durations:
+            return durations
+        return [row["total"] for row in conn.execute(
+            f"SELECT SUM(duration) AS total FROM steps WHERE run > 0 AND session_id IN ({placeholders}){client_filter} "
+            "GROUP BY session_id, client, run HAVING SUM(action LIKE 'FAILED at %') = 0",
+            params,
+        )]
+    finally:
+        conn.close()
+
+def _midranks(values: list[float]) -> list[float]:
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+def mann_whitney_greater(latest: list[float], baseline: list[float]) -> float:
+    """One-sided Mann-Whitney U p-value for 'latest is slower than baseline'."""
+    n1, n2 = len(latest), len(baseline)
+    ranks = _midranks(latest + baseline)
+    observed = sum(ranks[:n1])
+    if math.comb(n1 + n2, n1) <= EXACT_TEST_LIMIT:
+        # Exact permutation test on the (mid)ranks
+        extreme = total = 0
+        for combo in itertools.combinations(ranks, n1):
+            total += 1
+            if sum(combo) >= observed - 1e-9:
+                extreme += 1
+        return extreme / total
+    u = observed - n1 * (n1 + 1) / 2
+    mean_u = n1 * n2 / 2
+    n = n1 + n2
+    tie_term = sum(t ** 3 - t for t in (ranks.count(r) for r in set(ranks)))
+    var_u = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if var_u <= 0:
+        return 1.0
+    z = (u - mean_u - 0.5) / math.sqrt(var_u)
+    return 1 - statistics.NormalDist().cdf(z)
+
+def wilcoxon_signed_rank(deltas: list[float]) -> float:
+    """Two-sided Wilcoxon signed-rank p-value for paired differences centred on zero (zero differences dropped)."""
+    deltas = [d for d in deltas if d != 0]
+    n = len(deltas)
+    if n == 0:
+        return 1.0
+    ranks = _midranks([abs(d) for d in deltas])
+    observed = sum(r for r, d in zip(ranks, deltas) if d > 0)
+    mean_w = sum(ranks) / 2
+    if 2 ** n <= EXACT_TEST_LIMIT:
+        # Exact: every assignment of signs to the ranks is equally likely under the null
+        extreme = total = 0
+        for signs in itertools.product((0, 1), repeat=n):
+            total += 1
+            if abs(sum(r for r, s in zip(ranks, signs) if s) - mean_w) >= abs(observed - mean_w) - 1e-9:
+                extreme += 1
+        return extreme / total
+    var_w = sum(r * r for r in ranks) / 4
+    z = (abs(observed - mean_w) - 0.5) / math.sqrt(var_w)
+    return min(1.0, 2 * (1 - statistics.NormalDist().cdf(z)))
+
+def single_sample_greater(value: float, baseline: list[float]) -> float:
+    """Approximate p-value that one new observation comes from a slower distribution than the baseline."""
+    mean = statistics.fmean(baseline)
+    stdev = statistics.stdev(baseline) if len(baseline) > 1 else 0.0
+    if stdev == 0:
+        return 0.0 if value > mean else 1.0
+    spread = stdev * math.sqrt(1 + 1 / len(baseline))
+    return 1 - statistics.NormalDist(mean, spread).cdf(value)
+
+def latency_increase_p_value(latest: list[float], baseline: list[float]) -> float:
+    if len(latest) == 1:
+        return single_sample_greater(latest[0], baseline)
+    return mann_whitney_greater(latest, baseline)
+
+def session_keys(conn: sqlite3.Connection, base_url: str | None = None, suite: str | None = None) -> list[tuple[str, str]]:
+    query = "SELECT DISTINCT base_url, suite FROM sessions WHERE 1 = 1"
+    params = []
+    if base_url:
+        query += " AND base_url = ?"
+        params.append(base_url)
+    if suite:
+        query += " AND suite = ?"
+        params.append(suite)
+    return [(row["base_url"], row["suite"]) for row in conn.execute(query, params)]
+
+def compare_latest(db_path: Path | None = None, base_url: str | None = None, suite: str | None = None,
+                   window: int = BASELINE_SESSIONS, threshold: float = REGRESSION_THRESHOLD,
+                   alpha: float = SIGNIFICANCE_LEVEL) -> list[dict]:
+    """Compare the latest session of each (base_url, suite) against the previous `window` sessions."""
+    results = []
+    conn = connect(db_path)
+    try:
+        for key_url, key_suite in session_keys(conn, base_url, suite):
+            session_rows = conn.execute(
+                "SELECT id, started_at, git_revision FROM sessions WHERE base_url = ? AND suite = ? "
+                "AND id IN (SELECT session_id FROM steps) ORDER BY id DESC LIMIT ?",
+                (key_url, key_suite, window + 1),
+            ).fetchall()
+            if not session_rows:
+                continue
+            latest, baseline_ids = session_rows[0], [row["id"] for row in session_rows[1:]]
+            actions = [row["action"] for row in conn.execute(
+                "SELECT DISTINCT action FROM steps WHERE session_id = ? AND duration IS NOT NULL ORDER BY action",
+                (latest["id"],),
+            )]
+            for action in actions:
+                latest_values = action_durations(conn, action, [latest["id"]])
+                baseline_values = action_durations(conn, action, baseline_ids)
+                result = {
+                    "base_url": key_url, "suite": key_suite, "action": action,
+                    "session_id": latest["id"], "started_at": latest["started_at"],
+                    "git_revision": latest["git_revision"],
+                    "latest_median": statistics.median(latest_values),
+                    "baseline_median": None, "change": None, "p_value": None,
+                    "n_latest": len(latest_values), "n_baseline": len(baseline_values),
+                    "regressed": False,
+                }
+                if len(baseline_values) >= 2:
+                    baseline_median = statistics.median(baseline_values)
+                    change = (result["latest_median"] - baseline_median) / baseline_median if baseline_median else 0.0
+                    p_value = latency_increase_p_value(latest_values, baseline_values)
+                    result.update(
+                        baseline_median=baseline_median, change=change, p_value=p_value,
+                        regressed=change > threshold and p_value < alpha,
+                    )
+                results.append(result)
+    finally:
+        conn.close()
+    return results
+
+def print_report(results: list[dict]) -> None:
+    if not results:
+        print("No recorded sessions found.")
+        return
+    current_key = None
+    for r in results:
+        key = (r["base_url"], r["suite"])
+        if key != current_key:
+            current_key = key
+            print(f"\n{r['suite']} @ {r['base_url']} - session {r['session_id']} "
+                  f"({r['started_at']}, rev {r['git_revision'] or 'unknown'})")
+            print(f"  {'Action':<45} {'Latest (s)':>10} {'Baseline (s)':>12} {'Change':>8} {'p':>7}  Flag")
+        baseline = "-" if r["baseline_median"] is None else f"{r['baseline_median']:.2f}"
+        change = "-" if r["change"] is None else f"{r['change'] * 100:+.1f}%"
+        p_value = "-" if r["p_value"] is None else f"{r['p_value']:.3f}"
+        flag = "REGRESSED" if r["regressed"] else ""
+        print(f"  {r['action'][:45]:<45} {r['latest_median']:>10.2f} {baseline:>12} {change:>8} {p_value:>7}  {flag}")
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the latest Faybl test session against a rolling baseline.")
+    parser.add_argument("--db", type=Path, help="Path to the run history database (default: HISTORY_DB in harness.py)")
+    parser.add_argument("--base-url", help="Only report sessions for this BASE_URL")
+    parser.add_argument("--suite", help="Only report this suite (e.g. ybl_api_1517, test_prototype)")
+    parser.add_argument("--window", type=int, default=BASELINE_SESSIONS, help="Number of baseline sessions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Median increase that counts as a regression (0.2 = 20%%)")
+    parser.add_argument("--alpha", type=float, default=SIGNIFICANCE_LEVEL, help="Significance level of the rank test")
+    args = parser.parse_args(argv)
+
+    results = compare_latest(args.db, args.base_url, args.suite, args.window, args.threshold, args.alpha)
+    print_report(results)
+    regressions = [r for r in results if r["regressed"]]
+    if regressions:
+        print(f"\n{len(regressions)} action(s) regressed beyond {args.threshold * 100:.0f}%.")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import json
+import time
+from pathlib import Path
+
+# ===================================== CONFIGURATION ===================================== #
+MAX_STEP_ATTEMPTS = 3 # Attempts per step before the whole run is marked as failed
+RETRY_DELAY_S = 5 # Pause between two attempts of the same step
+# ========================================================================================= #
+
+class RunState:
+    """Completed steps of one run. Persisted steps (saved files) survive a restart of the suite."""
+
+    def __init__(self, path: Path | None = None):
+        self.path = path
+        self.completed = {} # step -> value returned by the step
+        self.persisted = {} # step -> {"value": ..., "is_path": bool}, written to `path`
+        if path is not None and path.exists():
+            with path.open("r", encoding="utf-8") as f:
+                saved = json.load(f)
+            for step, entry in saved.get("steps", {}).items():
+                if entry["is_path"] and not Path(entry["value"]).exists():
+                    continue # The saved file is gone, redo the step
+                value = Path(entry["value"]) if entry["is_path"] else entry["value"]
+                self.completed[step] = value
+                self.persisted[step] = entry
+            if self.completed:
+                print(f"Resuming from checkpoint {path.name}: {', '.join(self.completed)}")
+
+    def is_done(self, step: str) -> bool:
+        return step in self.completed
+
+    def value(self, step: str):
+        return self.completed.get(step)
+
+    def complete(self, step: str, value=None, persist: bool = False) -> None:
+        self.completed[step] = value
+        if persist and self.path is not None:
+            is_path = isinstance(value, Path)
+            self.persisted[step] = {"value": str(value) if is_path else value, "is_path": is_path}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("w", encoding="utf-8") as f:
+                json.dump({"steps": self.persisted}, f, indent=2)
+
+    def clear(self) -> None:
+        """Forget the checkpoint once the run has finished successfully."""
+        self.completed.clear()
+        self.persisted.clear()
+        if self.path is not None and self.path.exists():
+            self.path.unlink()
+
+def run_step(state: RunState, step: str, fn, time_data: list[dict], retry_data: list[dict], base_row: dict,
+             retry_on=(Exception,), persist: bool = False, recover=None,
+             max_attempts: int = MAX_STEP_ATTEMPTS):
+    """Run fn(attempt) unless `step` is already checkpointed, retrying it alone on `retry_on` errors.
+
+    Timing rows appended by fn are tagged with the attempt number, so first-attempt latency can be
+    reported separately from retries. Every failed attempt (and a successful retry) goes to retry_data.
+    """
+    if state.is_done(step):
+        print(f"Skipping '{step}' (already completed)")
+        return state.value(step)
+    for attempt in range(1, max_attempts + 1):
+        first_row = len(time_data)
+        attempt_start = time.time()
+        try:
+            value = fn(attempt)
+        except retry_on as e:
+            del time_data[first_row:] # Partial timings of a failed attempt are not kept
+            message = str(e).strip()
+            retry_data.append({
+                **base_row, "step": step, "attempt": attempt, "outcome": "failed",
+                "duration": time.time() - attempt_start,
+                "error": message.splitlines()[0] if message else type(e).__name__,
+            })
+            if attempt == max_attempts:
+                raise
+            print(f"Step '{step}' failed on attempt {attempt}/{max_attempts}. Error: {e}")
+            print(f"Retrying '{step}' in {RETRY_DELAY_S}s...")
+            time.sleep(RETRY_DELAY_S)
+            if recover is not None:
+                recover()
+            continue
+        for row in time_data[first_row:]:
+            row["attempt"] = attempt
+        if attempt > 1:
+            retry_data.append({
+                **base_row, "step": step, "attempt": attempt, "outcome": "succeeded",
+                "duration": time.time() - attempt_start, "error": "",
+            })
+        state.complete(step, value, persist=persist)
+        return value
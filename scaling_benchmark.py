@@ -0,0 +1,229 @@
+import argparse
+import csv
+import dataclasses
+import importlib
+import math
+import random
+import statistics
+import sys
+from datetime import datetime
+from pathlib import Path
+from playwright.sync_api import sync_playwright
+from harness import HEADLESS, INPUT_DIR, Harness
+
+# ===================================== CONFIGURATION ===================================== #
+DIMENSIONS = { # Sizes benchmarked for each dimension when --sizes is not given
+    "pages": [2, 4, 8, 16, 32, 64],
+    "fields": [10, 40, 160, 640],
+    "table_rows": [10, 50, 250, 1000],
+}
+BASE_SIZE = {"pages": 2, "fields": 20, "table_rows": 10} # Values of the dimensions that are not being varied
+FIELDS_PER_PAGE = 30 # Form fields that fit on one page; more fields add pages
+TABLE_ROWS_PER_PAGE = 40 # Table rows that fit on one page; more rows add pages
+RUNS_PER_SIZE = 2 # Repetitions of the flow at each size (the median is fitted)
+SYNTHETIC_PREFIX = "synthetic" # Generated files are named <prefix>_<dimension>_<size>.pdf
+SYNTHETIC_DIR = INPUT_DIR / "synthetic" # Kept apart from the suites' inputs and the input corpus index
+# ========================================================================================= #
+
+SECTIONS = ["Client Details", "Partner Details", "Employment", "Income", "Expenses", "Assets", "Liabilities",
+            "Superannuation", "Insurance", "Goals", "Risk Profile", "Estate Planning"]
+FIELDS = ["Name", "Date of Birth", "Address", "Phone", "Email", "Occupation", "Employer", "Annual Amount",
+          "Frequency", "Owner", "Provider", "Account Number", "Balance", "Notes"]
+
+def _pdf_text(value: str) -> str:
+    return "(" + value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+def write_synthetic_pdf(path: Path, pages: int, fields: int, table_rows: int, seed: int = 0) -> Path:
+    """Write a fillable PDF with `fields` text fields and a `table_rows`-row trades table over at least `pages` pages.
+
+    Plain PDF 1.4 written by hand (Helvetica, AcroForm text fields), so no PDF library is needed.
+    """
+    rng = random.Random(seed)
+    field_pages = math.ceil(fields / FIELDS_PER_PAGE)
+    table_pages = math.ceil(table_rows / TABLE_ROWS_PER_PAGE)
+    pages = max(pages, field_pages + table_pages, 1)
+    objects = {} # object number -> body
+    font, catalog, page_tree = 1, 2, 3
+    objects[font] = "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    next_id = 4
+    page_ids, field_ids = [], []
+    field_no = row_no = 0
+    for page_index in range(pages):
+        page_id, content_id = next_id, next_id + 1
+        next_id += 2
+        lines = [f"BT /F1 14 Tf 50 760 Td {_pdf_text(f'Synthetic client profile - page {page_index + 1} of {pages}')} Tj ET"]
+        annots = []
+        if page_index < field_pages:
+            for slot in range(min(FIELDS_PER_PAGE, fields - field_no)):
+                y = 730 - slot * 23
+                label = f"{SECTIONS[field_no // len(FIELDS) % len(SECTIONS)]} > {FIELDS[field_no % len(FIELDS)]} {field_no + 1}"
+                lines.append(f"BT /F1 9 Tf 50 {y + 5} Td {_pdf_text(label)} Tj ET")
+                value = "" if rng.random() < 0.5 else f"Value {rng.randint(1000, 99999)}"
+                objects[next_id] = (
+                    f"<< /Type /Annot /Subtype /Widget /FT /Tx /T {_pdf_text(f'field_{field_no + 1}')} "
+                    f"/TU {_pdf_text(label)} /V {_pdf_text(value)} /Rect [300 {y} 560 {y + 18}] /P {page_id} 0 R "
+                    f"/F 4 /DA (/Helv 9 Tf 0 g) /MK << /BC [0 0 0] >> >>"
+                )
+                annots.append(next_id)
+                field_ids.append(next_id)
+                next_id += 1
+                field_no += 1
+        elif row_no < table_rows:
+            lines.append(f"BT /F1 11 Tf 50 735 Td {_pdf_text('Trades')} Tj ET")
+            for slot in range(min(TABLE_ROWS_PER_PAGE, table_rows - row_no)):
+                y = 715 - slot * 17
+                cells = [f"{rng.choice(['Buy', 'Sell'])}", f"ASX:{rng.choice(['BHP', 'CBA', 'CSL', 'WES', 'NAB'])}",
+                         f"{rng.randint(1, 5000)}", f"{rng.uniform(1, 200):.2f}", f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"]
+                for col, cell in enumerate(cells):
+                    lines.append(f"BT /F1 9 Tf {55 + col * 105} {y + 4} Td {_pdf_text(cell)} Tj ET")
+                lines.append(f"50 {y} m 575 {y} l S")
+                row_no += 1
+            top, bottom = 715 + 17, 715 - (min(TABLE_ROWS_PER_PAGE, table_rows) - 1) * 17
+            lines.extend(f"{50 + col * 105} {top} m {50 + col * 105} {bottom} l S" for col in range(6))
+        else: # Extra pages of file notes, so the page count grows the text to read as well
+            for slot in range(45):
+                note = f"{rng.choice(SECTIONS)}: {rng.choice(FIELDS).lower()} reviewed with the client on " \
+                       f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}, reference {rng.randint(10000, 99999)}."
+                lines.append(f"BT /F1 9 Tf 50 {730 - slot * 15} Td {_pdf_text(note)} Tj ET")
+        stream = "\n".join(lines)
+        objects[content_id] = f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream"
+        annots_ref = f" /Annots [{' '.join(f'{a} 0 R' for a in annots)}]" if annots else ""
+        objects[page_id] = (
+            f"<< /Type /Page /Parent {page_tree} 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {content_id} 0 R{annots_ref} >>"
+        )
+        page_ids.append(page_id)
+    objects[page_tree] = f"<< /Type /Pages /Kids [{' '.join(f'{p} 0 R' for p in page_ids)}] /Count {len(page_ids)} >>"
+    objects[catalog] = (
+        f"<< /Type /Catalog /Pages {page_tree} 0 R /AcroForm << /Fields [{' '.join(f'{f} 0 R' for f in field_ids)}] "
+        f"/NeedAppearances true /DA (/Helv 9 Tf 0 g) /DR << /Font << /Helv {font} 0 R >> >> >> >>"
+    )
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += f"{number} 0 obj\n{objects[number]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offsets[n]:010d} 00000 n \n" for n in sorted(objects)).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes(out))
+    return path
+
+def generate_inputs(dimension: str, sizes: list[int], directory: Path = SYNTHETIC_DIR) -> dict[int, Path]:
+    """One synthetic PDF per size, varying `dimension` and keeping the others at BASE_SIZE."""
+    files = {}
+    for size in sizes:
+        spec = {**BASE_SIZE, dimension: size}
+        path = directory / f"{SYNTHETIC_PREFIX}_{dimension}_{size:05d}.pdf"
+        files[size] = write_synthetic_pdf(path, spec["pages"], spec["fields"], spec["table_rows"], seed=size)
+        print(f"Generated {path.name}: {spec} ({path.stat().st_size / 1024:.0f} KB)")
+    return files
+
+def step_name(action: str, document: str) -> str:
+    """Action label without the per-size file name, so a step is comparable across sizes."""
+    return action.replace(document, "{document}").replace(Path(document).stem, "{document}").strip()
+
+def fit_scaling(sizes: list[float], values: list[float]) -> dict:
+    """Linear fit (seconds per unit of size) and power-law exponent k of t ~ a * size^k (log-log fit)."""
+    fit = {"slope": None, "intercept": None, "exponent": None, "r2": None, "complexity": "n/a", "knee": None}
+    by_size = {}
+    for s, v in zip(sizes, values):
+        if v is not None and v > 0 and s > 0:
+            by_size.setdefault(s, []).append(v)
+    # One point per size, smallest first, so consecutive points always grow in size
+    points = [(s, statistics.median(by_size[s])) for s in sorted(by_size)]
+    if len(points) < 3:
+        return fit
+    xs, ys = zip(*points)
+    linear = statistics.linear_regression(xs, ys)
+    log_x, log_y = [math.log(x) for x in xs], [math.log(y) for y in ys]
+    power = statistics.linear_regression(log_x, log_y)
+    mean_log_y = statistics.fmean(log_y)
+    ss_tot = sum((y - mean_log_y) ** 2 for y in log_y)
+    ss_res = sum((y - (power.intercept + power.slope * x)) ** 2 for x, y in zip(log_x, log_y))
+    k = power.slope
+    fit.update(slope=linear.slope, intercept=linear.intercept, exponent=k,
+               r2=1 - ss_res / ss_tot if ss_tot else 1.0)
+    fit["complexity"] = ("~constant" if k < 0.3 else "sublinear" if k < 0.8 else "~linear" if k < 1.3
+                         else "superlinear" if k < 1.8 else "~quadratic or worse")
+    # First size where the growth between two consecutive sizes becomes superlinear
+    for (x0, y0), (x1, y1) in zip(points, points[1:]):
+        if math.log(y1 / y0) / math.log(x1 / x0) > 1.5:
+            fit["knee"] = x1
+            break
+    return fit
+
+def run_benchmark(harness, scenario, dimension: str, sizes: list[int], runs: int = RUNS_PER_SIZE) -> tuple[dict, dict]:
+    """Run the flow on each synthetic size; returns ({step: {size: median}}, {step: fit})."""
+    files = generate_inputs(dimension, sizes)
+    harness.corpora.pop(SYNTHETIC_DIR, None) # Index the files just written
+    durations = {} # step -> size -> [seconds]
+    run_number = 0
+    for size, path in files.items():
+        variant = dataclasses.replace(scenario, patterns=[path.stem], num_runs=len(sizes) * runs,
+                                      input_dir=SYNTHETIC_DIR)
+        for _ in range(runs):
+            run_number += 1
+            # Per-client flows run for the first client only: the size, not the client, is the variable
+            result = variant.run(harness, run_number, 0 if variant.per_client else None)
+            if result.failed:
+                print(f"  [WARNING] {dimension}={size} run failed, its timings are left out: {result.error}")
+                continue
+            for row in result.time_data:
+                if row.get("attempt", 1) == 1 and row["duration"] is not None:
+                    durations.setdefault(step_name(row["action"], path.name), {}).setdefault(size, []).append(row["duration"])
+    medians = {step: {size: statistics.median(v) for size, v in by_size.items()} for step, by_size in durations.items()}
+    fits = {step: fit_scaling(sizes, [by_size.get(size) for size in sizes]) for step, by_size in medians.items()}
+    return medians, fits
+
+def report(path: Path, scenario, dimension: str, sizes: list[int], medians: dict, fits: dict) -> None:
+    print(f"\n{'Step':<35} " + " ".join(f"{s:>8}" for s in sizes) + f" {'s/unit':>8} {'k':>6} {'R2':>5}  Complexity (knee)")
+    with open(path, mode="a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([f"SCALING {scenario.title} - {dimension} - {datetime.now().isoformat(timespec='seconds')}"])
+        w.writerow(["Step", *[f"{dimension}={s} (s)" for s in sizes], "Seconds per unit", "Exponent k", "R2",
+                    "Complexity", "Knee"])
+        for step, by_size in medians.items():
+            fit = fits[step]
+            cells = [by_size.get(s) for s in sizes]
+            fmt = lambda v, spec: "" if v is None else format(v, spec)
+            w.writerow([step, *[fmt(c, ".2f") for c in cells], fmt(fit["slope"], ".4f"), fmt(fit["exponent"], ".2f"),
+                        fmt(fit["r2"], ".2f"), fit["complexity"], fit["knee"] or ""])
+            knee = f" (knee at {fit['knee']})" if fit["knee"] else ""
+            print(f"{step[:35]:<35} " + " ".join(f"{fmt(c, '.1f') or '-':>8}" for c in cells)
+                  + f" {fmt(fit['slope'], '.3f') or '-':>8} {fmt(fit['exponent'], '.2f') or '-':>6}"
+                  + f" {fmt(fit['r2'], '.2f') or '-':>5}  {fit['complexity']}{knee}")
+        w.writerow([])
+    print(f"\nScaling results appended to {path.name}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark how each step's latency scales with synthetic document size.")
+    parser.add_argument("suite", help="Suite whose flow the synthetic files are run through (e.g. ybl_api_1517)")
+    parser.add_argument("--dimension", choices=list(DIMENSIONS), default="pages", help="Size dimension to vary")
+    parser.add_argument("--sizes", help="Comma-separated sizes (default depends on the dimension)")
+    parser.add_argument("--runs", type=int, default=RUNS_PER_SIZE, help="Runs per size")
+    parser.add_argument("--generate-only", action="store_true", help="Only write the synthetic files")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS, help="Run Chromium without a window")
+    args = parser.parse_args(argv)
+
+    sizes = sorted({int(s) for s in args.sizes.split(",")}) if args.sizes else DIMENSIONS[args.dimension]
+    if args.generate_only:
+        generate_inputs(args.dimension, sizes)
+        return 0
+    base = importlib.import_module(args.suite).SCENARIO
+    scenario = dataclasses.replace(base, suite=f"{base.suite}-scaling", title=f"{base.title} (size scaling)",
+                                   csv_name=f"scaling_{args.dimension}_runs.csv")
+    with sync_playwright() as playwright:
+        harness = Harness(playwright, headless=args.headless)
+        try:
+            medians, fits = run_benchmark(harness, scenario, args.dimension, sizes, args.runs)
+        finally:
+            harness.close()
+    report(scenario.output_dir / f"scaling_{args.dimension}.csv", scenario, args.dimension, sizes, medians, fits)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import heapq
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from playwright.sync_api import sync_playwright
+import metrics
+import run_history
+from harness import HISTORY_DB
+from scenario import RunResult
+
+# ===================================== CONFIGURATION ===================================== #
+DEFAULT_WORKERS = 1 # Browsers running units side by side
+HISTORY_SESSIONS = 30 # Recent sessions a unit's duration estimate is based on
+DEFAULT_UNIT_ESTIMATE_S = 600 # Estimate for a suite that has no recorded runs yet
+# ========================================================================================= #
+
+@dataclass
+class PlannedUnit:
+    """A run unit with its estimated duration and, once executed, what actually happened."""
+    scenario: object
+    unit: object
+    estimate: float
+    source: str # Where the estimate came from: "client", "suite" or "default"
+    worker: str | None = None
+    started: float | None = None
+    finished: float | None = None
+    result: object = None
+
+    @property
+    def label(self) -> str:
+        client = f" {self.unit.client_name}" if self.unit.client_name else ""
+        return f"{self.scenario.suite}{client} run {self.unit.run_number}"
+
+    @property
+    def actual(self) -> float | None:
+        return None if self.finished is None else self.finished - self.started
+
+def estimate(scenario, unit, db_path=HISTORY_DB, sessions: int = HISTORY_SESSIONS) -> tuple[float, str]:
+    """Median past wall time of this (suite, client), else of the suite, else the default."""
+    if unit.client_name is not None:
+        durations = run_history.recent_unit_durations(db_path, scenario.base_url, scenario.suite, sessions,
+                                                      unit.client_name)
+        if durations:
+            return statistics.median(durations), "client"
+    durations = run_history.recent_unit_durations(db_path, scenario.base_url, scenario.suite, sessions)
+    if durations:
+        return statistics.median(durations), "suite"
+    return DEFAULT_UNIT_ESTIMATE_S, "default"
+
+def plan(scenarios: list, db_path=HISTORY_DB) -> list[PlannedUnit]:
+    """Every unit of `scenarios`, longest estimate first (LPT order)."""
+    planned = []
+    for scenario in scenarios:
+        for unit in scenario.units():
+            value, source = estimate(scenario, unit, db_path)
+            planned.append(PlannedUnit(scenario, unit, value, source))
+    planned.sort(key=lambda p: p.estimate, reverse=True)
+    return planned
+
+def predicted_makespan(planned: list[PlannedUnit], workers: int) -> float:
+    """Makespan of dispatching `planned` in order, each unit to the worker that frees up first."""
+    loads = [0.0] * max(1, workers)
+    for p in planned:
+        heapq.heappush(loads, heapq.heappop(loads) + p.estimate)
+    return max(loads)
+
+def run_planned(harness, planned: list[PlannedUnit], workers: int, autotune=None) -> float:
+    """Execute `planned` in order on `workers` browsers and return the actual makespan.
+
+    The calling thread keeps `harness`; each extra worker thread opens its own Playwright instance
+    (the sync API is bound to its thread) and shares the harness's logins, reports and caches.
+    With an AutoTuner the sweep starts on one worker and follows the level the tuner picks after each unit:
+    new workers are started, and surplus ones stop once their current unit is done.
+    """
+    queue = list(planned)
+    queue_lock = threading.Lock()
+    running = {harness.name}
+    threads = []
+    target = autotune.level if autotune else workers
+    if harness.resources is not None:
+        harness.resources.concurrency = target
+    metrics.WORKERS.set(target)
+
+    def next_unit(h):
+        with queue_lock:
+            if not queue or (h is not harness and len(running) > target):
+                running.discard(h.name)
+                return None
+            return queue.pop(0) # Longest remaining unit goes to the first free worker
+
+    def drain(h):
+        nonlocal target
+        while (p := next_unit(h)) is not None:
+            p.worker = h.name
+            p.started = time.time()
+            try:
+                p.result = p.scenario.run(h, p.unit.run_number, p.unit.client_index)
+            except Exception as e: # Setup errors (e.g. login) surface here, keep the other units going
+                print(f"{p.label} could not start. Error: {e}")
+                p.result = RunResult(p.unit, error=str(e), worker=h.name)
+            p.finished = time.time()
+            if autotune:
+                with queue_lock:
+                    autotune.observe(p.scenario.suite, p.result.time_data)
+                    target = autotune.decide()
+                    while len(running) < target and queue:
+                        start_worker()
+
+    def worker_thread(index):
+        with sync_playwright() as playwright:
+            h = harness.worker(playwright, f"worker{index}", shard=(0, 1) if autotune else (index, workers))
+            try:
+                drain(h)
+            finally:
+                h.close()
+
+    def start_worker():
+        index = len(threads) + 1
+        running.add(f"worker{index}")
+        t = threading.Thread(target=worker_thread, args=(index,), name=f"worker{index}")
+        threads.append(t)
+        t.start()
+
+    sweep_start = time.time()
+    # Tagged inputs are split across the workers; an auto-tuned sweep doesn't know their number up front
+    harness.shard = (0, 1) if autotune else (0, workers)
+    with queue_lock:
+        for _ in range(1, target):
+            start_worker()
+    drain(harness)
+    for t in threads: # Threads started while joining are appended and joined too
+        t.join()
+    return time.time() - sweep_start
+
+def print_schedule(planned: list[PlannedUnit], workers: int, predicted: float, actual: float | None = None) -> None:
+    print(f"\n{'Unit':<50} {'Estimate (s)':>12} {'Source':>8} {'Actual (s)':>11} {'Worker':>8}")
+    for p in planned:
+        measured = "-" if p.actual is None else f"{p.actual:.1f}"
+        print(f"{p.label[:50]:<50} {p.estimate:>12.1f} {p.source:>8} {measured:>11} {p.worker or '-':>8}")
+    total = sum(p.estimate for p in planned)
+    lower_bound = max(total / max(1, workers), max((p.estimate for p in planned), default=0.0))
+    print(f"\nWorkers: {workers}, units: {len(planned)}, estimated work: {total:.1f}s")
+    print(f"Predicted makespan (LPT): {predicted:.1f}s (lower bound {lower_bound:.1f}s)")
+    if actual is not None:
+        print(f"Actual makespan: {actual:.1f}s ({(actual - predicted) / predicted * 100 if predicted else 0:+.1f}% vs predicted)")
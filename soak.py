@@ -0,0 +1,184 @@
+import argparse
+import csv
+import importlib
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from playwright.sync_api import sync_playwright
+from client_profiles import DEFAULT_PROFILE, PROFILES
+from harness import HEADLESS, Harness
+from resources import process_rss
+from run_state import RunState
+from scenario import RunContext, RunResult, execute_step
+
+# ===================================== CONFIGURATION ===================================== #
+SOAK_ITERATIONS = 30 # Times the soak cycle is repeated in the same page
+SOAK_WARMUP_ITERATIONS = 2 # First iterations left out of the trend fit (caches, lazy-loaded bundles)
+HEAP_GROWTH_LIMIT_MB = 1.0 # Fail when the JS heap grows faster than this per iteration
+DOM_NODES_GROWTH_LIMIT = 500 # Fail when the DOM node count grows faster than this per iteration
+RSS_GROWTH_LIMIT_MB = 5.0 # Fail when renderer RSS grows faster than this per iteration
+LATENCY_GROWTH_LIMIT = 0.02 # Fail when a step slows down by more than this fraction of its median per iteration
+LATENCY_GROWTH_FLOOR_S = 0.05 # ...and by more than this many seconds per iteration (ignores jitter on short steps)
+# ========================================================================================= #
+
+class MemorySampler:
+    """JS heap and DOM node count of one page (CDP Performance domain) plus the RSS of the renderer processes."""
+
+    def __init__(self, context, page, browser):
+        self.page_cdp = context.new_cdp_session(page)
+        self.page_cdp.send("Performance.enable")
+        self.browser_cdp = browser.new_browser_cdp_session()
+
+    def renderer_rss(self) -> int | None:
+        """Summed RSS of the browser's renderer processes (the soak page is the only page open)."""
+        try:
+            info = self.browser_cdp.send("SystemInfo.getProcessInfo")
+        except Exception:
+            return None
+        sizes = [process_rss(p["id"]) for p in info.get("processInfo", []) if p.get("type") == "renderer"]
+        sizes = [size for size in sizes if size is not None]
+        return sum(sizes) if sizes else None
+
+    def sample(self) -> dict:
+        self.page_cdp.send("HeapProfiler.collectGarbage") # Only retained memory counts as growth
+        metrics = {m["name"]: m["value"] for m in self.page_cdp.send("Performance.getMetrics")["metrics"]}
+        rss = self.renderer_rss()
+        return {
+            "heap_mb": metrics.get("JSHeapUsedSize", 0) / 2**20,
+            "dom_nodes": int(metrics.get("Nodes", 0)),
+            "listeners": int(metrics.get("JSEventListeners", 0)),
+            "rss_mb": None if rss is None else rss / 2**20,
+        }
+
+def slope(values: list[float]) -> float | None:
+    """Least-squares growth per iteration, None with fewer than 3 points."""
+    points = [(i, v) for i, v in enumerate(values) if v is not None]
+    if len(points) < 3:
+        return None
+    xs, ys = zip(*points)
+    return statistics.linear_regression(xs, ys).slope
+
+def fit_trends(iterations: list[dict], warmup: int = SOAK_WARMUP_ITERATIONS) -> list[dict]:
+    """Growth per iteration of every memory metric and step latency, with the limit each one is held to."""
+    fitted = iterations[warmup:] if len(iterations) - warmup >= 3 else iterations
+    trends = []
+    for metric, unit, limit in (("heap_mb", "MB", HEAP_GROWTH_LIMIT_MB), ("dom_nodes", "nodes", DOM_NODES_GROWTH_LIMIT),
+                                ("rss_mb", "MB", RSS_GROWTH_LIMIT_MB), ("listeners", "listeners", None)):
+        growth = slope([it[metric] for it in fitted])
+        trends.append({"name": metric, "growth": growth, "unit": unit, "limit": limit,
+                       "failed": growth is not None and limit is not None and growth > limit})
+    actions = list(dict.fromkeys(a for it in fitted for a in it["durations"]))
+    for action in actions:
+        values = [it["durations"].get(action) for it in fitted]
+        growth = slope(values)
+        present = [v for v in values if v is not None]
+        median = statistics.median(present) if present else 0.0
+        limit = max(LATENCY_GROWTH_LIMIT * median, LATENCY_GROWTH_FLOOR_S)
+        trends.append({"name": action, "growth": growth, "unit": "s", "limit": limit,
+                       "failed": growth is not None and growth > limit})
+    return trends
+
+def run_soak(harness, scenario, iterations: int = SOAK_ITERATIONS) -> tuple[list[dict], list[dict], str | None]:
+    """Run the scenario's setup steps once, then its soak cycle `iterations` times in one page."""
+    marker = next((i for i, step in enumerate(scenario.steps) if step.kind == "soak-cycle"), None)
+    if marker is None:
+        raise ValueError(f"{scenario.suite} has no soak_cycle() step")
+    harness.setup(scenario)
+    unit = scenario.units()[0]
+    result = RunResult(unit)
+    context = harness.new_context(scenario, unit)
+    page = context.new_page()
+    # No checkpoints, and no tracing: its buffers would show up as memory growth
+    ctx = RunContext(harness, scenario, unit, context, page, result, resume=False, trace=False)
+    samples = []
+    error = None
+    try:
+        for step in scenario.steps[:marker]:
+            execute_step(ctx, step)
+        sampler = MemorySampler(context, page, harness.browser)
+        baseline = sampler.sample()
+        print(f"Soak baseline: heap {baseline['heap_mb']:.1f} MB, {baseline['dom_nodes']} DOM nodes")
+        for iteration in range(1, iterations + 1):
+            print(f"\n----- {scenario.suite} soak iteration {iteration}/{iterations} -----")
+            ctx.state = RunState() # Every iteration redoes the whole cycle
+            first_row = len(result.time_data)
+            iteration_start = time.time()
+            for step in scenario.steps[marker + 1:]:
+                execute_step(ctx, step)
+            durations = {}
+            for row in result.time_data[first_row:]:
+                if row.get("attempt", 1) == 1 and row["duration"] is not None:
+                    durations[row["action"].strip()] = row["duration"]
+            sample = {"iteration": iteration, "cycle_s": time.time() - iteration_start,
+                      "durations": durations, **sampler.sample()}
+            samples.append(sample)
+            rss = "n/a" if sample["rss_mb"] is None else f"{sample['rss_mb']:.0f} MB"
+            print(f"Iteration {iteration}: cycle {sample['cycle_s']:.1f}s, heap {sample['heap_mb']:.1f} MB, "
+                  f"{sample['dom_nodes']} DOM nodes, renderer RSS {rss}")
+    except Exception as e:
+        print(f"Soak FAILED at iteration {len(samples) + 1}, step: {ctx.current_step}. Error: {e}")
+        ctx.capture.failure(page, f"FAIL_Soak_Iteration{len(samples) + 1}_Step_{ctx.current_step}")
+        error = f"Soak failed at iteration {len(samples) + 1}, step {ctx.current_step}. Error: {e}"
+    finally:
+        ctx.capture.close()
+        context.close()
+    return samples, fit_trends(samples), error
+
+def write_soak_csv(path: Path, scenario, samples: list[dict], trends: list[dict], error: str | None) -> None:
+    actions = list(dict.fromkeys(a for s in samples for a in s["durations"]))
+    with open(path, mode="a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([f"SOAK {scenario.title} - {datetime.now().isoformat(timespec='seconds')}"])
+        w.writerow(["Iteration", "Cycle (s)", "JS heap (MB)", "DOM nodes", "Listeners", "Renderer RSS (MB)", *actions])
+        for s in samples:
+            rss = "" if s["rss_mb"] is None else f"{s['rss_mb']:.1f}"
+            durations = [f"{s['durations'][a]:.2f}" if a in s["durations"] else "" for a in actions]
+            w.writerow([s["iteration"], f"{s['cycle_s']:.2f}", f"{s['heap_mb']:.2f}", s["dom_nodes"], s["listeners"],
+                        rss, *durations])
+        w.writerow([])
+        w.writerow(["TREND", "Growth per iteration", "Unit", "Limit", "Result"])
+        for t in trends:
+            growth = "" if t["growth"] is None else f"{t['growth']:.4f}"
+            limit = "" if t["limit"] is None else f"{t['limit']:.4f}"
+            w.writerow([t["name"], growth, t["unit"], limit, "FAILED" if t["failed"] else "ok"])
+        if error:
+            w.writerow([error])
+        w.writerow([])
+
+def print_trends(trends: list[dict]) -> None:
+    print(f"\n{'Metric / step':<45} {'Growth/iter':>12} {'Limit':>10}  Result")
+    for t in trends:
+        growth = "-" if t["growth"] is None else f"{t['growth']:+.3f} {t['unit']}"
+        limit = "-" if t["limit"] is None else f"{t['limit']:.3f}"
+        print(f"{t['name'][:45]:<45} {growth:>12} {limit:>10}  {'FAILED' if t['failed'] else 'ok'}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Repeat a suite's cycle in one page and report memory and latency growth.")
+    parser.add_argument("suite", help="Suite module (e.g. ybl_api_1517)")
+    parser.add_argument("--iterations", type=int, default=SOAK_ITERATIONS, help="Soak cycle repetitions")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, choices=list(PROFILES), help="Client profile to soak under")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS, help="Run Chromium without a window")
+    args = parser.parse_args(argv)
+
+    scenario = importlib.import_module(args.suite).SCENARIO.with_profile(args.profile)
+    with sync_playwright() as playwright:
+        harness = Harness(playwright, headless=args.headless)
+        try:
+            samples, trends, error = run_soak(harness, scenario, args.iterations)
+        finally:
+            harness.close()
+    print_trends(trends)
+    soak_csv = scenario.output_dir / "soak_metrics.csv"
+    write_soak_csv(soak_csv, scenario, samples, trends, error)
+    print(f"Soak metrics appended to {soak_csv.name}")
+    failed = [t["name"] for t in trends if t["failed"]]
+    if failed:
+        print(f"\nGrowth above the limit: {', '.join(failed)}")
+    if error:
+        print(error)
+    return 1 if failed or error else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
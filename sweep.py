@@ -0,0 +1,101 @@
+import argparse
+import importlib
+import sys
+from playwright.sync_api import sync_playwright
+import metrics
+import resources
+import scheduler
+from client_profiles import DEFAULT_PROFILE, PROFILES
+from har_replay import parse_timing
+from harness import BASE_PROJECT_DIR, HEADLESS, Harness
+
+# ===================================== CONFIGURATION ===================================== #
+DEFAULT_SUITES = ["test_prototype", "ybl_api_1517", "ybl_api_1514"] # Suite modules run by a sweep
+# ========================================================================================= #
+
+def load_scenarios(names: list[str]) -> list:
+    """SCENARIO of each suite module."""
+    return [importlib.import_module(name).SCENARIO for name in names]
+
+def parse_workers(value: str) -> int | None:
+    """--workers: a number, or "auto" (None) to let the auto-tuner pick it."""
+    return None if value == "auto" else int(value)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run several suites in one process, sharing the browser and logins.")
+    parser.add_argument("suites", nargs="*", default=DEFAULT_SUITES, help="Suite modules to run")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS, help="Run Chromium without a window")
+    parser.add_argument("--profiles", default=DEFAULT_PROFILE,
+                        help=f"Comma-separated client profiles to run every suite under ({', '.join(PROFILES)})")
+    parser.add_argument("--network", default="live", choices=["live", "record", "replay"],
+                        help="live, record (save each run's traffic to a HAR) or replay (serve it from the HAR)")
+    parser.add_argument("--replay-timing", default="1", type=parse_timing,
+                        help='Replay: scale of the recorded response times (1 = original) or "instant"')
+    parser.add_argument("--workers", type=parse_workers, default=scheduler.DEFAULT_WORKERS,
+                        help='Browsers running units side by side, or "auto" to add workers until the harness CPU '
+                             'saturates or step latency inflates')
+    parser.add_argument("--max-workers", type=int, default=resources.AUTOTUNE_MAX_WORKERS,
+                        help="Auto-tune: most workers to try")
+    parser.add_argument("--metrics-port", type=int, default=metrics.METRICS_PORT,
+                        help="Serve live OpenMetrics on http://127.0.0.1:<port>/metrics during the sweep")
+    parser.add_argument("--metrics-textfile", default=metrics.METRICS_TEXTFILE,
+                        help="Rewrite this file (*.prom) with the metrics in the Prometheus text format every few "
+                             "seconds during the sweep (node_exporter textfile collector)")
+    parser.add_argument("--plan-only", action="store_true", help="Print the LPT schedule and predicted makespan, run nothing")
+    args = parser.parse_args(argv)
+
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    scenarios = [s.with_profile(p).with_network(args.network, args.replay_timing)
+                 for s in load_scenarios(args.suites) for p in profiles]
+    workers = max(1, args.workers or 1)
+    if args.plan_only:
+        planned = scheduler.plan(scenarios)
+        scheduler.print_schedule(planned, workers, scheduler.predicted_makespan(planned, workers))
+        return 0
+    failures = 0
+    exporter = metrics.Exporter(args.metrics_port, args.metrics_textfile)
+    monitor = resources.ResourceMonitor()
+    autotune = resources.AutoTuner(monitor, args.max_workers) if args.workers is None and monitor.available else None
+    if args.workers is None and autotune is None:
+        print("  [WARNING] Auto-tune needs resource sampling, running 1 worker.")
+    with sync_playwright() as playwright:
+        harness = Harness(playwright, headless=args.headless)
+        harness.resources = monitor if monitor.available else None
+        try:
+            # Set up every suite first, so logins and the Gemini SDK are ready before the first run
+            for scenario in scenarios:
+                try:
+                    harness.prepare(scenario)
+                except Exception as e:
+                    print(f"Setup of {scenario.suite} failed. Error: {e}")
+            ready = [s for s in scenarios if s.suite in harness.reports]
+            failures += len(scenarios) - len(ready)
+
+            # Longest units first, each to the first free worker
+            planned = scheduler.plan(ready)
+            predicted = scheduler.predicted_makespan(planned, workers)
+            scheduler.print_schedule(planned, workers, predicted)
+            actual = scheduler.run_planned(harness, planned, workers, autotune)
+            if autotune:
+                workers = autotune.level
+            scheduler.print_schedule(planned, workers, predicted, actual)
+            failures += sum(p.result.failed for p in planned)
+
+            # Concurrency and headroom of the sweep, reported in every suite's session
+            monitor.close()
+            if monitor.available:
+                summary = monitor.summary()
+                resources.print_resources(summary, workers, autotune)
+                for report in harness.reports.values():
+                    report.resources(summary, workers, autotune is not None)
+                resources.write_samples(BASE_PROJECT_DIR / "output_files" / "resource_usage.csv", monitor.samples,
+                                        workers, autotune)
+        finally:
+            monitor.close()
+            harness.close()
+            exporter.close()
+    print(f"\nSweep finished: {failures} failed run(s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import statistics
+from pathlib import Path
+import run_history
+
+# ===================================== CONFIGURATION ===================================== #
+TIMEOUT_PERCENTILE = 99 # Historical percentile the deadline is based on
+TIMEOUT_FACTOR = 1.5 # Headroom multiplier applied to the percentile
+TIMEOUT_FLOOR_MS = 30_000 # Never wait less than this, however fast the history is
+TIMEOUT_CEILING_MS = 1_800_000 # Never wait longer than this, however slow the history is
+MIN_SAMPLES = 5 # Below this many successful samples the fixed fallback timeout is used
+HISTORY_SESSIONS = 30 # Only the most recent sessions are considered
+# ========================================================================================= #
+
+class TimeoutPolicy:
+    """Derive step deadlines from run history, falling back to fixed timeouts on a cold start."""
+
+    def __init__(self, db_path: Path, base_url: str, suite: str,
+                 percentile: int = TIMEOUT_PERCENTILE, factor: float = TIMEOUT_FACTOR,
+                 floor_ms: int = TIMEOUT_FLOOR_MS, ceiling_ms: int = TIMEOUT_CEILING_MS,
+                 min_samples: int = MIN_SAMPLES, sessions: int = HISTORY_SESSIONS):
+        self.db_path = db_path
+        self.base_url = base_url
+        self.suite = suite
+        self.percentile = percentile
+        self.factor = factor
+        self.floor_ms = floor_ms
+        self.ceiling_ms = ceiling_ms
+        self.min_samples = min_samples
+        self.sessions = sessions
+        self._budgets = {} # action -> derived budget in ms (None when history is too thin)
+
+    def _derive(self, action: str) -> int | None:
+        try:
+            durations = run_history.recent_durations(
+                self.db_path, self.base_url, self.suite, action, self.sessions
+            )
+        except Exception as e:
+            print(f"  [WARNING] Could not read run history for '{action}': {e}")
+            return None
+        if len(durations) < self.min_samples:
+            return None
+        cut_points = statistics.quantiles(durations, n=100, method="inclusive")
+        value_s = cut_points[self.percentile - 1] if self.percentile < 100 else max(durations)
+        budget_ms = int(value_s * 1000 * self.factor)
+        return max(self.floor_ms, min(self.ceiling_ms, budget_ms))
+
+    def budget(self, action: str, fallback_ms: int) -> int:
+        """Timeout in ms for a wait bounded by `action`'s recorded duration."""
+        if action not in self._budgets:
+            self._budgets[action] = self._derive(action)
+            derived = self._budgets[action]
+            if derived is None:
+                print(f"  Timeout for '{action}': {fallback_ms / 1000:.0f}s (fixed, not enough history)")
+            else:
+                print(f"  Timeout for '{action}': {derived / 1000:.0f}s (p{self.percentile} x {self.factor})")
+        derived = self._budgets[action]
+        return fallback_ms if derived is None else derived
@@ -0,0 +1,218 @@
+import argparse
+import csv
+import importlib
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from playwright.sync_api import sync_playwright, expect
+from harness import HEADLESS, Harness, format_bytes
+from run_history import SIGNIFICANCE_LEVEL, wilcoxon_signed_rank
+
+# ===================================== CONFIGURATION ===================================== #
+UPLOAD_URL_PATTERN = None # Regex of Faybl's upload request URLs, None = any POST/PUT/PATCH with a large enough body
+MIN_UPLOAD_BYTES = 16 * 1024 # Requests with smaller bodies are API calls, not file uploads
+UPLOAD_WAIT_MS = 120_000 # How long to wait for upload requests still in flight once the UI says it's done
+MULTIPART_OVERHEAD_BYTES = 4 * 1024 # A request body at most this much larger than a file is taken to carry that file
+COMPARE_ROUNDS = 6 # Rounds of the batched-versus-sequential comparison, each uploads the file set both ways (6+)
+# ========================================================================================= #
+
+UPLOAD_METHODS = ("POST", "PUT", "PATCH")
+
+class UploadMonitor:
+    """Upload requests a page sends while the monitor is active, timed by the browser: bytes, duration and
+    MB/s of each request, matched to the files it carried."""
+
+    def __init__(self, page, files: list[Path]):
+        self.page = page
+        self.files = list(files)
+        self._requests = []
+        self._done = []
+
+    def __enter__(self) -> "UploadMonitor":
+        self.page.on("request", self._on_request)
+        self.page.on("requestfinished", self._on_done)
+        self.page.on("requestfailed", self._on_done)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.page.remove_listener("request", self._on_request)
+        self.page.remove_listener("requestfinished", self._on_done)
+        self.page.remove_listener("requestfailed", self._on_done)
+
+    def _on_request(self, request) -> None:
+        if request.method in UPLOAD_METHODS and (UPLOAD_URL_PATTERN is None or re.search(UPLOAD_URL_PATTERN, request.url)):
+            self._requests.append(request)
+
+    def _on_done(self, request) -> None:
+        self._done.append(request)
+
+    def wait(self, timeout_ms: int = UPLOAD_WAIT_MS) -> None:
+        """Let the requests seen so far finish (the upload button can turn enabled before the last byte is acknowledged)."""
+        deadline = time.time() + timeout_ms / 1000
+        while any(not any(r is d for d in self._done) for r in self._requests):
+            if time.time() > deadline:
+                print(f"  [WARNING] Upload requests still in flight after {timeout_ms / 1000:.0f}s, left out.")
+                return
+            self.page.wait_for_timeout(100)
+
+    def _carried(self, request, size: int) -> list[str]:
+        """Files a request body carried: named in its multipart parts, else matched by size."""
+        try:
+            body = request.post_data_buffer or b""
+        except Exception:
+            body = b""
+        names = [p.name for p in self.files if f'filename="{p.name}"'.encode() in body]
+        if names:
+            return names
+        return [p.name for p in self.files if 0 <= size - p.stat().st_size <= MULTIPART_OVERHEAD_BYTES]
+
+    def transfers(self) -> list[dict]:
+        """Finished upload requests, in the order they were sent."""
+        rows = []
+        for request in self._requests:
+            if not any(request is d for d in self._done):
+                continue
+            size = request.sizes()["requestBodySize"] if request.failure is None else len(request.post_data_buffer or b"")
+            if size < MIN_UPLOAD_BYTES:
+                continue
+            timing = request.timing
+            # Request sent until the response started: covers the body transfer and Faybl acknowledging it
+            duration = None
+            if timing["requestStart"] >= 0 and timing["responseStart"] >= timing["requestStart"]:
+                duration = (timing["responseStart"] - timing["requestStart"]) / 1000
+            rows.append({
+                "url": request.url, "files": self._carried(request, size), "bytes": size, "duration": duration,
+                "mb_per_s": size / 2**20 / duration if duration else None, "error": request.failure,
+            })
+        return rows
+
+def describe(transfer: dict) -> str:
+    files = ", ".join(transfer["files"]) or "unmatched request"
+    if transfer["error"]:
+        return f"{files}: FAILED ({transfer['error']})"
+    duration = "n/a" if transfer["duration"] is None else f"{transfer['duration']:.2f}s"
+    rate = "" if transfer["mb_per_s"] is None else f" ({transfer['mb_per_s']:.2f} MB/s)"
+    return f"{files}: {format_bytes(transfer['bytes'])} in {duration}{rate}"
+
+def upload_files(page, base_url: str, files: list[Path], strategy: str, timeout_ms: int = UPLOAD_WAIT_MS) -> dict:
+    """Upload `files` on a fresh chat page, all in one file-input call ("batched") or one call per file
+    ("sequential", waiting for each upload before the next). Nothing is sent to the chat."""
+    from scenario import page_locators
+    loc = page_locators(page)
+    page.goto(base_url, wait_until="domcontentloaded")
+    expect(loc.chat_input).to_be_visible(timeout=10_000)
+    batches = [files] if strategy == "batched" else [[path] for path in files]
+    with UploadMonitor(page, files) as uploads:
+        start = time.time()
+        for batch in batches:
+            loc.upload_input.set_input_files([str(path) for path in batch])
+            expect(loc.prompt_button).to_be_enabled(timeout=timeout_ms)
+            uploads.wait(timeout_ms)
+        total = time.time() - start
+    transfers = uploads.transfers()
+    size = sum(t["bytes"] for t in transfers)
+    return {"strategy": strategy, "total": total, "bytes": size, "mb_per_s": size / 2**20 / total if total else None,
+            "transfers": transfers}
+
+def compare_strategies(harness, scenario, rounds: int = COMPARE_ROUNDS) -> list[dict]:
+    """Upload the scenario's file set batched and sequentially `rounds` times, alternating which goes first."""
+    harness.setup(scenario)
+    files = harness.corpus.select(scenario.patterns)
+    unit = scenario.units()[0]
+    samples = []
+    for round_number in range(1, rounds + 1):
+        order = ["batched", "sequential"] if round_number % 2 else ["sequential", "batched"]
+        for strategy in order:
+            context = harness.new_context(scenario, unit)
+            try:
+                sample = upload_files(context.new_page(), scenario.base_url, files, strategy)
+            finally:
+                context.close()
+            sample["round"] = round_number
+            samples.append(sample)
+            print(f"Round {round_number} {strategy}: {len(files)} file(s), {format_bytes(sample['bytes'])} "
+                  f"in {sample['total']:.2f}s")
+            for transfer in sample["transfers"]:
+                print(f"  > {describe(transfer)}")
+            if not sample["transfers"]:
+                print(f"  [WARNING] No upload request of at least {format_bytes(MIN_UPLOAD_BYTES)} seen, "
+                      f"check UPLOAD_URL_PATTERN.")
+    return samples
+
+def summarize(samples: list[dict]) -> dict:
+    """Median wall time and throughput of each strategy, and the paired test of their per-round difference."""
+    by_round = {}
+    for s in samples:
+        by_round.setdefault(s["round"], {})[s["strategy"]] = s["total"]
+    deltas = [r["sequential"] - r["batched"] for r in by_round.values() if len(r) == 2]
+    # The exact test cannot go below 2 / 2**rounds; with fewer rounds a p-value would not be evidence either way
+    summary = {"p_value": wilcoxon_signed_rank(deltas) if deltas and 2 ** (1 - len(deltas)) <= SIGNIFICANCE_LEVEL else None,
+               "rounds": len(deltas)}
+    for strategy in ("batched", "sequential"):
+        mine = [s for s in samples if s["strategy"] == strategy]
+        rates = [s["mb_per_s"] for s in mine if s["mb_per_s"] is not None]
+        summary[strategy] = {"median_s": statistics.median(s["total"] for s in mine) if mine else None,
+                             "median_mb_per_s": statistics.median(rates) if rates else None}
+    return summary
+
+def write_comparison(path: Path, scenario, samples: list[dict], summary: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, mode="a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow([f"UPLOAD STRATEGY {scenario.title} - {datetime.now().isoformat(timespec='seconds')}"])
+        w.writerow(["Strategy", "Median wall time (s)", "Median throughput (MB/s)"])
+        for strategy in ("batched", "sequential"):
+            s = summary[strategy]
+            w.writerow([strategy, "" if s["median_s"] is None else f"{s['median_s']:.2f}",
+                        "" if s["median_mb_per_s"] is None else f"{s['median_mb_per_s']:.2f}"])
+        w.writerow(["p-value (paired)", f"n/a ({summary['rounds']} paired round(s) cannot reach p < {SIGNIFICANCE_LEVEL})"
+                    if summary["p_value"] is None else f"{summary['p_value']:.4f}"])
+        w.writerow([])
+        w.writerow(["Round", "Strategy", "Wall time (s)", "Request", "Files", "Bytes", "Duration (s)", "MB/s", "Error"])
+        for s in samples:
+            for index, t in enumerate(s["transfers"], start=1):
+                w.writerow([s["round"], s["strategy"], f"{s['total']:.2f}", index, "; ".join(t["files"]),
+                            t["bytes"],
+                            "" if t["duration"] is None else f"{t['duration']:.2f}",
+                            "" if t["mb_per_s"] is None else f"{t['mb_per_s']:.2f}", t["error"] or ""])
+        w.writerow([])
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Upload a suite's file set batched and one file at a time, "
+                                                 "and compare which Faybl handles faster.")
+    parser.add_argument("suite", help="Suite module whose file patterns are uploaded (e.g. ybl_api_1517)")
+    parser.add_argument("--rounds", type=int, default=COMPARE_ROUNDS, help="Rounds, each uploads both ways")
+    parser.add_argument("--headless", action="store_true", default=HEADLESS, help="Run Chromium without a window")
+    args = parser.parse_args(argv)
+
+    scenario = importlib.import_module(args.suite).SCENARIO
+    with sync_playwright() as playwright:
+        harness = Harness(playwright, headless=args.headless)
+        try:
+            samples = compare_strategies(harness, scenario, args.rounds)
+        finally:
+            harness.close()
+    summary = summarize(samples)
+    print(f"\n{'Strategy':<12} {'Median (s)':>10} {'MB/s':>8}")
+    for strategy in ("batched", "sequential"):
+        s = summary[strategy]
+        median = "" if s["median_s"] is None else f"{s['median_s']:.2f}"
+        rate = "" if s["median_mb_per_s"] is None else f"{s['median_mb_per_s']:.2f}"
+        print(f"{strategy:<12} {median:>10} {rate:>8}")
+    if summary["batched"]["median_s"] is not None and summary["sequential"]["median_s"] is not None:
+        faster = min(("batched", "sequential"), key=lambda k: summary[k]["median_s"])
+        if summary["p_value"] is None:
+            p_value = f" (too few paired rounds for a significance test: {summary['rounds']})"
+        else:
+            p_value = f" (paired p = {summary['p_value']:.3f} over {summary['rounds']} round(s))"
+        print(f"Faster: {faster}{p_value}")
+    upload_csv = scenario.output_dir / "upload_comparison.csv"
+    write_comparison(upload_csv, scenario, samples, summary)
+    print(f"Upload comparison appended to {upload_csv.name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,549 @@
+import argparse
+import dataclasses
+import importlib
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+import metrics
+from harness import BASE_PROJECT_DIR, HEADLESS, HISTORY_DB, SuiteReport
+import run_history
+
+# ===================================== CONFIGURATION ===================================== #
+QUEUE_DB = BASE_PROJECT_DIR / "output_files" / "work_queue.sqlite" # Shared by the coordinator and every worker
+HEARTBEAT_S = 15 # How often a worker renews the lease on its unit
+LEASE_S = 120 # A unit whose worker has not sent a heartbeat for this long is re-queued
+MAX_UNIT_ATTEMPTS = 3 # A unit lost this many times is marked failed instead of re-queued
+POLL_S = 2.0 # How often idle workers and the coordinator check the queue
+JOURNAL_MODE = "WAL" # SQLite journal; use "DELETE" when the queue file sits on a network share for remote workers
+# ========================================================================================= #
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sweeps (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    suites TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sweep_id INTEGER NOT NULL REFERENCES sweeps(id),
+    priority INTEGER NOT NULL,
+    module TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    network TEXT NOT NULL,
+    replay_timing REAL,
+    suite TEXT NOT NULL,
+    client_index INTEGER,
+    run_number INTEGER NOT NULL,
+    document TEXT,
+    estimate REAL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL,
+    result TEXT,
+    merged INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL,
+    unit_id INTEGER,
+    units_done INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS step_stream (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    unit_id INTEGER NOT NULL REFERENCES units(id),
+    worker TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    row TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_units_claim ON units(sweep_id, state, priority);
+"""
+
+def connect(db_path: Path = QUEUE_DB) -> sqlite3.Connection:
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    # Transactions are explicit; the worker's heartbeat thread shares the connection under WorkQueue's lock
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+    conn.executescript(SCHEMA)
+    if "attempt" not in {c["name"] for c in conn.execute("PRAGMA table_info(step_stream)")}: # Queue files from before attempts
+        conn.execute("ALTER TABLE step_stream ADD COLUMN attempt INTEGER NOT NULL DEFAULT 0")
+    return conn
+
+def load_scenario(unit) -> object:
+    """The scenario a queued unit belongs to, as its worker and the coordinator rebuild it."""
+    scenario = importlib.import_module(unit["module"]).SCENARIO
+    scenario = scenario.with_profile(unit["profile"]).with_network(unit["network"], unit["replay_timing"])
+    if unit["document"] is not None:
+        scenario = dataclasses.replace(scenario, patterns=[unit["document"]])
+    return scenario
+
+def result_payload(result, login_duration: float | None) -> str:
+    return json.dumps({**dataclasses.asdict(result), "login_duration": login_duration}, default=str)
+
+def load_result(payload: str):
+    from scenario import RunResult, RunUnit
+    data = json.loads(payload)
+    data.pop("login_duration", None)
+    return RunResult(**{**data, "unit": RunUnit(**data["unit"])})
+
+class WorkQueue:
+    """SQLite-backed queue of (suite, client, run[, document]) units shared by a coordinator and its workers.
+
+    Workers claim the next unit in a write transaction, renew a lease on it while it runs and stream its
+    timing rows back. Units whose lease expires (the worker died or lost the host) go back to the queue.
+    """
+
+    def __init__(self, db_path: Path = QUEUE_DB):
+        self.db_path = Path(db_path)
+        self._conn = connect(self.db_path)
+        self._lock = threading.Lock() # The heartbeat thread shares the connection
+
+    def _write(self, query: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(query, params)
+
+    def _read(self, query: str, params=()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def publish(self, scenarios: list, modules: dict, split_documents: bool = False) -> int:
+        """Queue every unit of `scenarios`, longest estimate first, and return the sweep id.
+
+        `modules` maps each scenario's suite key to its module. With `split_documents`, suites that loop over
+        their documents are queued one unit per (client, run, document) file pattern.
+        """
+        import scheduler
+        planned = scheduler.plan(scenarios)
+        rows = []
+        for p in planned:
+            s = p.scenario
+            documents = [None]
+            if split_documents and s.has_step("for-each-document") and len(s.patterns) > 1:
+                documents = list(s.patterns)
+            for document in documents:
+                rows.append((modules[s.suite], s.profile, s.network, s.replay_timing, s.suite, p.unit.client_index,
+                             p.unit.run_number, document, p.estimate / len(documents)))
+        rows.sort(key=lambda r: r[-1], reverse=True)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            cursor = self._conn.execute("INSERT INTO sweeps (created_at, suites) VALUES (?, ?)",
+                                        (datetime.now().isoformat(timespec="seconds"), json.dumps(sorted(modules.values()))))
+            sweep_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO units (sweep_id, priority, module, profile, network, replay_timing, suite, client_index, "
+                "run_number, document, estimate) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(sweep_id, priority, *row) for priority, row in enumerate(rows)],
+            )
+            self._conn.execute("COMMIT")
+        print(f"Published sweep {sweep_id}: {len(rows)} unit(s) to {self.db_path}")
+        return sweep_id
+
+    def latest_sweep(self) -> int | None:
+        rows = self._read("SELECT id FROM sweeps ORDER BY id DESC LIMIT 1")
+        return rows[0]["id"] if rows else None
+
+    def register(self, worker: str) -> None:
+        now = time.time()
+        self._write("INSERT OR REPLACE INTO workers (name, host, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?)",
+                    (worker, socket.gethostname(), os.getpid(), now, now))
+
+    def claim(self, sweep_id: int, worker: str):
+        """Take the next queued unit of the sweep for `worker`, None when nothing is queued."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE") # One claimer at a time, across processes
+            try:
+                unit = self._conn.execute("SELECT * FROM units WHERE sweep_id = ? AND state = 'queued' "
+                                          "ORDER BY priority LIMIT 1", (sweep_id,)).fetchone()
+                if unit is not None:
+                    self._conn.execute("UPDATE units SET state = 'claimed', worker = ?, attempts = attempts + 1, "
+                                       "claimed_at = ?, heartbeat_at = ? WHERE id = ?", (worker, now, now, unit["id"]))
+                    self._conn.execute("UPDATE workers SET unit_id = ?, heartbeat_at = ? WHERE name = ?",
+                                       (unit["id"], now, worker))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return unit
+
+    def heartbeat(self, worker: str, unit_id: int | None) -> None:
+        now = time.time()
+        self._write("UPDATE workers SET heartbeat_at = ? WHERE name = ?", (now, worker))
+        if unit_id is not None:
+            self._write("UPDATE units SET heartbeat_at = ? WHERE id = ? AND worker = ? AND state = 'claimed'",
+                        (now, unit_id, worker))
+
+    def stream_step(self, unit_id: int, worker: str, row: dict) -> None:
+        """Stream a timing row of the attempt `worker` is running; dropped once the unit is no longer its."""
+        self._write("INSERT INTO step_stream (unit_id, worker, attempt, row) SELECT id, worker, attempts, ? FROM units "
+                    "WHERE id = ? AND worker = ? AND state = 'claimed'",
+                    (json.dumps(row, default=str), unit_id, worker))
+
+    def complete(self, unit_id: int, worker: str, result, login_duration: float | None = None) -> bool:
+        """Store a finished unit's result; False when the unit was re-queued to another worker meanwhile."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                stored = self._conn.execute(
+                    "UPDATE units SET state = ?, finished_at = ?, result = ? WHERE id = ? AND worker = ? "
+                    "AND state = 'claimed'",
+                    ("failed" if result.failed else "done", time.time(), result_payload(result, login_duration),
+                     unit_id, worker)).rowcount == 1
+                self._conn.execute("UPDATE workers SET unit_id = NULL, units_done = units_done + ? WHERE name = ?",
+                                   (int(stored), worker))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return stored
+
+    def release(self, unit_id: int, worker: str) -> None:
+        """Hand an unfinished unit back (worker stopping), without counting it as an attempt."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                released = self._conn.execute(
+                    "UPDATE units SET state = 'queued', worker = NULL, attempts = attempts - 1 "
+                    "WHERE id = ? AND worker = ? AND state = 'claimed'", (unit_id, worker)).rowcount == 1
+                if released: # Its partial timings must not count next to the rerun's
+                    self._conn.execute("DELETE FROM step_stream WHERE unit_id = ?", (unit_id,))
+                self._conn.execute("UPDATE workers SET unit_id = NULL WHERE name = ?", (worker,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def requeue_lost(self, sweep_id: int, lease_s: float = LEASE_S, max_attempts: int = MAX_UNIT_ATTEMPTS) -> list:
+        """Re-queue claimed units whose lease expired; units lost `max_attempts` times are failed instead."""
+        cutoff = time.time() - lease_s
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                lost = self._conn.execute("SELECT * FROM units WHERE sweep_id = ? AND state = 'claimed' "
+                                          "AND heartbeat_at < ?", (sweep_id, cutoff)).fetchall()
+                for unit in lost:
+                    # The lost attempt's partial timings go with it, so they never count next to the rerun's
+                    self._conn.execute("DELETE FROM step_stream WHERE unit_id = ?", (unit["id"],))
+                    if unit["attempts"] >= max_attempts:
+                        self._conn.execute("UPDATE units SET state = 'failed', finished_at = ?, result = NULL "
+                                           "WHERE id = ?", (time.time(), unit["id"]))
+                    else:
+                        self._conn.execute("UPDATE units SET state = 'queued', worker = NULL WHERE id = ?",
+                                           (unit["id"],))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        for unit in lost:
+            action = "failed" if unit["attempts"] >= max_attempts else "re-queued"
+            print(f"  [WARNING] Worker {unit['worker']} lost {unit_label(unit)} "
+                  f"(no heartbeat for {lease_s:.0f}s), {action}.")
+        return lost
+
+    def counts(self, sweep_id: int) -> dict:
+        rows = self._read("SELECT state, COUNT(*) AS n FROM units WHERE sweep_id = ? GROUP BY state", (sweep_id,))
+        return {r["state"]: r["n"] for r in rows}
+
+    def is_finished(self, sweep_id: int) -> bool:
+        counts = self.counts(sweep_id)
+        return not counts.get("queued") and not counts.get("claimed")
+
+    def unmerged(self, sweep_id: int) -> list:
+        return self._read("SELECT * FROM units WHERE sweep_id = ? AND state IN ('done', 'failed') AND merged = 0 "
+                          "ORDER BY priority", (sweep_id,))
+
+    def mark_merged(self, unit_id: int) -> None:
+        self._write("UPDATE units SET merged = 1 WHERE id = ?", (unit_id,))
+
+    def streamed_since(self, sweep_id: int, last_id: int) -> list:
+        """Streamed rows after `last_id` of each unit's current attempt (rows of lost attempts are skipped)."""
+        return self._read("SELECT s.id, s.worker, s.row, u.suite FROM step_stream s JOIN units u ON u.id = s.unit_id "
+                          "WHERE u.sweep_id = ? AND s.id > ? AND s.attempt = u.attempts AND s.worker = u.worker "
+                          "ORDER BY s.id", (sweep_id, last_id))
+
+    def workers(self) -> list:
+        return self._read("SELECT * FROM workers ORDER BY name")
+
+    def finish_sweep(self, sweep_id: int) -> None:
+        self._write("UPDATE sweeps SET finished_at = ? WHERE id = ?", (datetime.now().isoformat(timespec="seconds"),
+                                                                     sweep_id))
+
+    def close(self) -> None:
+        self._conn.close()
+
+def unit_label(unit) -> str:
+    client = f" client {unit['client_index'] + 1}" if unit["client_index"] is not None else ""
+    document = f" [{unit['document']}]" if unit["document"] else ""
+    return f"{unit['suite']}{client} run {unit['run_number']}{document}"
+
+class QueueReport:
+    """Stands in for a worker's SuiteReport: a finished unit goes back to the queue instead of a CSV.
+    The coordinator merges it into the suite's one report."""
+
+    def __init__(self, queue: WorkQueue, worker: str, harness):
+        self.queue = queue
+        self.worker = worker
+        self.harness = harness
+        self.unit_id = None # Unit being run, set by the worker loop
+        self.base_url = None
+        self.completed = False
+
+    def add(self, result) -> None:
+        login_duration = self.harness._login_durations.get(self.base_url)
+        if not self.queue.complete(self.unit_id, self.worker, result, login_duration):
+            print(f"  [WARNING] {self.worker}'s unit was re-queued meanwhile, its result is dropped.")
+        self.completed = True
+
+    def login_failed(self) -> None:
+        pass
+
+    def finalize(self) -> None:
+        pass
+
+def run_worker(queue: WorkQueue, sweep_id: int, name: str, headless: bool = HEADLESS, max_units: int | None = None) -> int:
+    """Claim and run units of the sweep until none are left; returns the number of units run."""
+    from playwright.sync_api import sync_playwright
+    from harness import Harness
+    from resources import ResourceMonitor
+    from scenario import RunResult, run_unit
+
+    queue.register(name)
+    current = {"unit_id": None}
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_S):
+            try:
+                queue.heartbeat(name, current["unit_id"])
+            except sqlite3.Error as e:
+                print(f"  [WARNING] Heartbeat failed: {e}")
+
+    threading.Thread(target=beat, name="queue-heartbeat", daemon=True).start()
+    monitor = ResourceMonitor()
+    done = 0
+    print(f"Worker {name} on sweep {sweep_id} ({queue.db_path})")
+    with sync_playwright() as playwright:
+        harness = Harness(playwright, headless=headless, name=name)
+        harness.resources = monitor if monitor.available else None
+        harness.on_step = lambda unit, row: queue.stream_step(current["unit_id"], name, row)
+        try:
+            while max_units is None or done < max_units:
+                unit = queue.claim(sweep_id, name)
+                if unit is None:
+                    queue.requeue_lost(sweep_id) # Also recover units of dead workers when no coordinator runs
+                    if queue.is_finished(sweep_id):
+                        break
+                    time.sleep(POLL_S) # Others are still running, their units may come back
+                    continue
+                current["unit_id"] = unit["id"]
+                scenario = load_scenario(unit)
+                report = harness.reports.get(scenario.suite)
+                if not isinstance(report, QueueReport):
+                    harness.setup(scenario)
+                    report = harness.reports[scenario.suite] = QueueReport(queue, name, harness)
+                report.unit_id, report.base_url, report.completed = unit["id"], scenario.base_url, False
+                run = dataclasses.replace(scenario.unit(unit["run_number"], unit["client_index"]),
+                                          document=unit["document"])
+                print(f"\n{name} claimed {unit_label(unit)} (attempt {unit['attempts'] + 1})")
+                try:
+                    run_unit(harness, scenario, run)
+                except Exception as e: # Setup errors (e.g. login) surface here, report them as a failed unit
+                    print(f"{unit_label(unit)} could not start. Error: {e}")
+                    if not report.completed:
+                        queue.complete(unit["id"], name, RunResult(run, error=str(e), worker=name))
+                current["unit_id"] = None
+                done += 1
+        finally:
+            stop.set()
+            monitor.close()
+            if current["unit_id"] is not None: # Interrupted mid-unit: give it back right away
+                queue.release(current["unit_id"], name)
+            harness.close()
+    print(f"Worker {name} finished: {done} unit(s)")
+    return done
+
+class Merger:
+    """Turns the finished units of a sweep into one CSV report and run-history session per suite."""
+
+    def __init__(self, queue: WorkQueue, sweep_id: int):
+        self.queue = queue
+        self.sweep_id = sweep_id
+        self.reports = {} # suite -> SuiteReport
+        self.failures = 0
+        self._last_stream = 0
+
+    def pull_steps(self) -> int:
+        """Feed the timing rows streamed by the workers into this process's metrics."""
+        rows = self.queue.streamed_since(self.sweep_id, self._last_stream)
+        for r in rows:
+            row = json.loads(r["row"])
+            if row.get("duration") is not None:
+                metrics.STEP_SECONDS.observe(row["duration"], suite=r["suite"], action=row["action"],
+                                             client=row.get("client"))
+            self._last_stream = r["id"]
+        return len(rows)
+
+    def merge(self) -> int:
+        from scenario import RunResult
+        merged = 0
+        for unit in self.queue.unmerged(self.sweep_id):
+            scenario = load_scenario(unit)
+            if unit["result"] is None: # Lost too often, never finished
+                run = dataclasses.replace(scenario.unit(unit["run_number"], unit["client_index"]), document=unit["document"])
+                result = RunResult(run, error=f"Lost {unit['attempts']} time(s), worker {unit['worker']}")
+                login_duration = None
+            else:
+                result = load_result(unit["result"])
+                login_duration = json.loads(unit["result"]).get("login_duration")
+            report = self.reports.get(unit["suite"])
+            if report is None:
+                scenario.output_dir.mkdir(parents=True, exist_ok=True)
+                report = SuiteReport(scenario, run_history.start_session(HISTORY_DB, scenario.base_url, scenario.suite))
+                report.start(login_duration)
+                self.reports[unit["suite"]] = report
+            report.add(result)
+            self.failures += result.failed
+            metrics.RUNS.inc(suite=unit["suite"], outcome="failed" if result.failed else "passed")
+            self.queue.mark_merged(unit["id"])
+            merged += 1
+            outcome = "FAILED" if result.failed else "done"
+            print(f"{unit_label(unit)} {outcome} on {result.worker or unit['worker']}")
+        return merged
+
+    def finalize(self) -> None:
+        for report in self.reports.values():
+            report.finalize()
+
+def spawn_workers(count: int, db_path: Path, sweep_id: int, headless: bool) -> list[subprocess.Popen]:
+    """Local worker processes for this sweep (several on one box, or none when workers run elsewhere)."""
+    processes = []
+    for index in range(1, count + 1):
+        cmd = [sys.executable, str(Path(__file__).resolve()), "worker", "--queue", str(db_path),
+               "--sweep", str(sweep_id), "--name", f"{socket.gethostname()}-local{index}"]
+        if headless:
+            cmd.append("--headless")
+        processes.append(subprocess.Popen(cmd))
+    return processes
+
+def coordinate(queue: WorkQueue, sweep_id: int, local_workers: list[subprocess.Popen] = ()) -> int:
+    """Re-queue lost units and merge finished ones until the sweep is done; returns the failed units."""
+    merger = Merger(queue, sweep_id)
+    last_counts = None
+    while True:
+        queue.requeue_lost(sweep_id)
+        merger.pull_steps()
+        merger.merge()
+        counts = queue.counts(sweep_id)
+        for state in ("queued", "claimed", "done", "failed"):
+            metrics.QUEUE_UNITS.set(counts.get(state, 0), state=state)
+        if counts != last_counts:
+            print(f"Sweep {sweep_id}: " + ", ".join(f"{counts.get(s, 0)} {s}" for s in ("queued", "claimed", "done", "failed")))
+            last_counts = counts
+        if queue.is_finished(sweep_id):
+            break
+        if local_workers and all(p.poll() is not None for p in local_workers) and not counts.get("claimed"):
+            print("  [WARNING] Every local worker exited with units still queued, waiting for remote workers.")
+            local_workers = ()
+        time.sleep(POLL_S)
+    merger.pull_steps()
+    merger.merge()
+    merger.finalize()
+    queue.finish_sweep(sweep_id)
+    for p in local_workers:
+        p.wait()
+    print(f"\nSweep {sweep_id} finished: {merger.failures} failed unit(s), reports in "
+          + ", ".join(r.csv_path.name for r in merger.reports.values()))
+    return merger.failures
+
+def print_status(queue: WorkQueue, sweep_id: int) -> None:
+    counts = queue.counts(sweep_id)
+    print(f"Sweep {sweep_id}: " + ", ".join(f"{counts.get(s, 0)} {s}" for s in ("queued", "claimed", "done", "failed")))
+    now = time.time()
+    for w in queue.workers():
+        state = "lost" if now - w["heartbeat_at"] > LEASE_S else "alive"
+        print(f"  {w['name']:<30} {w['host']:<20} pid {w['pid']:<7} {state:<6} {w['units_done']} done, "
+              f"last heartbeat {now - w['heartbeat_at']:.0f}s ago")
+
+def main(argv=None) -> int:
+    from client_profiles import DEFAULT_PROFILE
+    from har_replay import parse_timing
+    from sweep import DEFAULT_SUITES
+    parser = argparse.ArgumentParser(description="Distributed sweep: a coordinator queues units in SQLite, "
+                                                 "worker processes on this or other hosts claim and run them.")
+    parser.add_argument("--queue", type=Path, default=QUEUE_DB, help="Queue database, shared by every process")
+    commands = parser.add_subparsers(dest="command", required=True)
+    publish = commands.add_parser("publish", help="Queue a sweep's units and exit")
+    coordinator = commands.add_parser("coordinate", help="Queue a sweep (if suites are given), then re-queue lost units "
+                                                         "and merge results until it is done")
+    for p in (publish, coordinator):
+        p.add_argument("suites", nargs="*", default=None if p is coordinator else DEFAULT_SUITES, help="Suite modules")
+        p.add_argument("--profiles", default=DEFAULT_PROFILE, help="Comma-separated client profiles")
+        p.add_argument("--network", default="live", choices=["live", "record", "replay"], help="Network mode")
+        p.add_argument("--replay-timing", default="1", type=parse_timing, help='Replay timing scale or "instant"')
+        p.add_argument("--split-documents", action="store_true",
+                       help="One unit per document for suites that loop over their documents")
+    coordinator.add_argument("--sweep", type=int, help="Sweep to coordinate (default: the latest)")
+    coordinator.add_argument("--local-workers", type=int, default=0, help="Worker processes to start on this host")
+    coordinator.add_argument("--headless", action="store_true", default=HEADLESS, help="Local workers without a window")
+    coordinator.add_argument("--metrics-port", type=int, default=metrics.METRICS_PORT,
+                             help="Serve the merged live OpenMetrics on http://127.0.0.1:<port>/metrics")
+    worker = commands.add_parser("worker", help="Claim and run units until the sweep is done")
+    worker.add_argument("--sweep", type=int, help="Sweep to work on (default: the latest)")
+    worker.add_argument("--name", default=f"{socket.gethostname()}-{os.getpid()}", help="Worker name")
+    worker.add_argument("--headless", action="store_true", default=HEADLESS, help="Run Chromium without a window")
+    worker.add_argument("--max-units", type=int, help="Stop after this many units")
+    status = commands.add_parser("status", help="Unit counts and worker heartbeats")
+    status.add_argument("--sweep", type=int, help="Sweep to show (default: the latest)")
+    args = parser.parse_args(argv)
+
+    queue = WorkQueue(args.queue)
+    try:
+        sweep_id = getattr(args, "sweep", None)
+        if args.command in ("publish", "coordinate") and args.suites:
+            profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+            modules, scenarios = {}, []
+            for name in args.suites:
+                for profile in profiles:
+                    scenario = importlib.import_module(name).SCENARIO.with_profile(profile)
+                    scenario = scenario.with_network(args.network, args.replay_timing)
+                    modules[scenario.suite] = name
+                    scenarios.append(scenario)
+            sweep_id = queue.publish(scenarios, modules, args.split_documents)
+            if args.command == "publish":
+                return 0
+        sweep_id = sweep_id or queue.latest_sweep()
+        if sweep_id is None:
+            print("No sweep in the queue, publish one first.")
+            return 1
+        if args.command == "status":
+            print_status(queue, sweep_id)
+            return 0
+        if args.command == "worker":
+            run_worker(queue, sweep_id, args.name, args.headless, args.max_units)
+            return 0
+        exporter = metrics.Exporter(args.metrics_port, None)
+        try:
+            local = spawn_workers(args.local_workers, args.queue, sweep_id, args.headless)
+            return 1 if coordinate(queue, sweep_id, local) else 0
+        finally:
+            exporter.close()
+    finally:
+        queue.close()
+
+if __name__ == "__main__":
+    sys.exit(main())